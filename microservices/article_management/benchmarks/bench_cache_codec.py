@@ -0,0 +1,69 @@
+"""
+Cached article encode/decode time and bytes stored per article, json text vs CacheCodec
+run from service root: python benchmarks/bench_cache_codec.py --content-size=20000
+"""
+import json
+import optparse
+import os
+import random
+import string
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.models import json_default  # noqa: E402
+from src.repositories.cache_codec import CacheCodec  # noqa: E402
+
+
+def make_article(content_size):
+    words = ["".join(random.choices(string.ascii_lowercase, k=random.randint(2, 10))) for _ in range(500)]
+    content = []
+    while sum(len(word) + 1 for word in content) < content_size:
+        content.append(random.choice(words))
+    return {
+        "value": {
+            "_id": "65f1c0ffee0ddba11ad5eed5",
+            "title": "Viewstamped Replication",
+            "author": "Brian Oki, Barbara Liskov",
+            "article_content": " ".join(content),
+            "publish_date": datetime(1988, 8, 1, tzinfo=timezone.utc),
+            "status": "published",
+            "star_ratio": 4.5,
+            "created_at": datetime.now(timezone.utc),
+        },
+        "fresh_until": time.time() + 240,
+    }
+
+
+def timed(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        result = func()
+    return (time.perf_counter() - started) / iterations * 1e6, result
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--content-size", default=20000, type="int", help="article_content length in chars")
+    parser.add_option("--iterations", default=2000, type="int", help="encodes/decodes per codec")
+    options, args = parser.parse_args()
+
+    article = make_article(options.content_size)
+    # previous implementation, json text decoded from redis as str
+    codecs = [("json text", lambda v: json.dumps(v, default=json_default).encode(), json.loads)]
+    for compression in (None, "lz4", "zstd"):
+        codec = CacheCodec(compression, compression_threshold=0)
+        codecs.append(("orjson+{}".format(compression or "raw"), codec.encode, codec.decode))
+
+    print("article_content: {} chars".format(options.content_size))
+    print("{:12} {:>12} {:>12} {:>12}".format("codec", "encode us", "decode us", "bytes"))
+    for name, encode, decode in codecs:
+        encode_us, data = timed(lambda: encode(article), options.iterations)
+        decode_us, _ = timed(lambda: decode(data), options.iterations)
+        print("{:12} {:12.1f} {:12.1f} {:12d}".format(name, encode_us, decode_us, len(data)))
+
+
+if __name__ == "__main__":
+    main()
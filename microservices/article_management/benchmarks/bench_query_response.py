@@ -0,0 +1,76 @@
+"""
+Response encoding cost of /api/v1/articles/query pages, to_jsonable + stdlib json vs MongoJSONResponse
+run from service root: python benchmarks/bench_query_response.py --page-size=100
+"""
+import optparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from bson import ObjectId, Decimal128
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.api.responses import MongoJSONResponse  # noqa: E402
+
+
+def to_jsonable(data):
+    # previous implementation, Decimal128 added since query pages
+    # with star_ratio could not be encoded by it at all
+    return jsonable_encoder(data, custom_encoder={ObjectId: str, Decimal128: lambda value: float(value.to_decimal())})
+
+
+def make_page(page_size):
+    # documents as motor returns them
+    now = datetime(2024, 5, 1, 12, 30, 15, 123000)
+    docs = [
+        {
+            "_id": ObjectId(),
+            "title": "Viewstamped Replication {}".format(i),
+            "author": "Brian Oki, Barbara Liskov",
+            "article_content": "https://dummy.cloudfront.net/assets/example{}.pdf".format(i),
+            "publish_date": now - timedelta(days=i),
+            "status": "published",
+            "star_ratio": Decimal128(Decimal("4.5")),
+            "review_count": i,
+            "created_at": now,
+            "updated_at": now,
+            "created_by": "3f2b6c1e9a8d4f7b",
+            "updated_by": "3f2b6c1e9a8d4f7b",
+        }
+        for i in range(page_size)
+    ]
+    return {"count": len(docs), "docs": docs}
+
+
+def microseconds(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--page-size", default=100, type="int", help="documents per query page")
+    parser.add_option("--iterations", default=500, type="int", help="responses to encode")
+    options, args = parser.parse_args()
+
+    page = make_page(options.page_size)
+    # route result went through jsonable_encoder twice (to_jsonable, then
+    # fastapi's serialize_response) before JSONResponse rendered it
+    before = microseconds(lambda: JSONResponse(jsonable_encoder(to_jsonable(page))), options.iterations)
+    after = microseconds(lambda: MongoJSONResponse(page), options.iterations)
+
+    print("page size: {} documents".format(options.page_size))
+    print("to_jsonable + json : {:10.1f} us/response".format(before))
+    print("MongoJSONResponse  : {:10.1f} us/response".format(after))
+    print("speedup            : {:10.2f}x".format(before / after))
+
+
+if __name__ == "__main__":
+    main()
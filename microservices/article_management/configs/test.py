@@ -9,5 +9,22 @@ test_config = {
     "mongo_database_name": "article_management_test",
     "encryption_file_path": getenv("ENCRYPTION_FILE_PATH", "../encryption_public_key.pem"),
     "test_encryption_file_path": "encryption_private_key.pem",
-    "redis_connection_string": "redis://localhost:6379"
+    "redis_connection_string": "redis://localhost:6379",
+    # writes also refresh entity cache instead of only deleting it
+    "cache_write_through": getenv("CACHE_WRITE_THROUGH", "true").lower() == "true",
+    # in-process L1 cache in front of redis, 0 entries disables
+    "l1_cache_max_entries": int(getenv("L1_CACHE_MAX_ENTRIES", "10000")),
+    "l1_cache_max_bytes": int(getenv("L1_CACHE_MAX_BYTES", "67108864")),
+    # cache shared by workers of one host through a mmap'ed file
+    # e.g. /dev/shm/article_management_cache, not set disables
+    "shared_cache_path": getenv("SHARED_CACHE_PATH"),
+    "shared_cache_size": int(getenv("SHARED_CACHE_SIZE", "67108864")),
+    "shared_cache_slots": int(getenv("SHARED_CACHE_SLOTS", "4096")),
+    # zstd or lz4 compresses cached values of at least threshold bytes, empty disables
+    "cache_compression": getenv("CACHE_COMPRESSION", "") or None,
+    "cache_compression_threshold": int(getenv("CACHE_COMPRESSION_THRESHOLD", "1024")),
+    "token_cache_max_size": int(getenv("TOKEN_CACHE_MAX_SIZE", "10000")),
+    "jwks_url": None,
+    "jwks_refresh_interval": int(getenv("JWKS_REFRESH_INTERVAL", "300")),
+    "permission_registry_url": None,
 }
\ No newline at end of file
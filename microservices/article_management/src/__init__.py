@@ -1,15 +1,28 @@
+import asyncio
+import logging
 from contextlib import asynccontextmanager
-from cryptography.hazmat.primitives import serialization
 
 from fastapi import FastAPI
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from src.api.healthcheck import init_healthcheck_api
+from src.api.metrics import init_metrics_api
 from src.api.articles import init_articles_api
+from src.api.responses import MongoJSONResponse
 from src.repositories.article_repository import ArticleRepository
 from src.repositories.cache_repository import CacheRepository
+from src.repositories.cache_codec import CacheCodec
+from src.repositories.local_cache import LocalCache
+from src.repositories.shared_cache import SharedMemoryCache
+from src.repositories.single_flight import SingleFlight
 from src.services.article_service import ArticleService
 from src.security.exceptions import init_exception_handler
+from src.security.key_set import JwksKeySet
+from src.security.permission_registry import PermissionRegistry
+from src.security.revocation import RevokedTokenFilter
+from src.security.token_cache import VerifiedTokenCache
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
@@ -20,23 +33,71 @@ async def lifespan(app):
     app.db = db_client[app.config["mongo_database_name"]]
 
     # init services
-    cache_repository = CacheRepository(app.config["redis_connection_string"])
-    article_repo = ArticleRepository(app.db, cache_repository)
+    # optional in-process L1 cache in front of redis
+    local_cache = None
+    if app.config["l1_cache_max_entries"] > 0:
+        local_cache = LocalCache(app.config["l1_cache_max_entries"], app.config["l1_cache_max_bytes"])
+    # optional cache shared by all workers of this host
+    shared_cache = None
+    if app.config["shared_cache_path"]:
+        shared_cache = SharedMemoryCache(
+            app.config["shared_cache_path"], app.config["shared_cache_size"], app.config["shared_cache_slots"]
+        )
+    cache_codec = CacheCodec(app.config["cache_compression"], app.config["cache_compression_threshold"])
+    cache_repository = CacheRepository(
+        app.config["redis_connection_string"], local_cache=local_cache, shared_cache=shared_cache, codec=cache_codec
+    )
+    app.cache_repository = cache_repository
+    cache_invalidation_task = asyncio.create_task(cache_repository.run_invalidation_loop())
+    # shared by repository and metrics api
+    app.single_flight = SingleFlight()
+    article_repo = ArticleRepository(app.db, cache_repository, app.config["cache_write_through"], app.single_flight)
     app.article_service = ArticleService(article_repo)
 
-    # this will use to verify jwts
-    with open(app.config["encryption_file_path"], "rb") as f:
-        public_key_file = serialization.load_pem_public_key(f.read())
-        app.public_key = public_key_file.public_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PublicFormat.SubjectPublicKeyInfo
-        )
+    # this will use to verify jwts, keys are selected by kid
+    app.key_set = JwksKeySet(
+        app.config["jwks_url"],
+        app.config["encryption_file_path"],
+        app.config["jwks_refresh_interval"]
+    )
+    try:
+        await app.key_set.refresh()
+    except Exception as exc:
+        # IAM may not be up yet, background refresh will retry
+        logger.warning("initial jwks refresh failed: {}".format(exc))
+    jwks_refresh_task = asyncio.create_task(app.key_set.run_refresh_loop())
+
+    # decodes bitmap permission claims, fetched again only when
+    # a token was issued with a newer registry version
+    app.permission_registry = PermissionRegistry(app.config["permission_registry_url"])
+    try:
+        await app.permission_registry.refresh()
+    except Exception as exc:
+        logger.warning("initial permission registry refresh failed: {}".format(exc))
+
+    # revoked jtis followed from IAM's redis stream
+    app.revoked_tokens = RevokedTokenFilter(app.config["redis_connection_string"])
+    try:
+        await app.revoked_tokens.sync()
+    except Exception as exc:
+        logger.warning("initial revoked token sync failed: {}".format(exc))
+    revoked_tokens_sync_task = asyncio.create_task(app.revoked_tokens.run_sync_loop())
+
+    # verified jwt claims, avoids signature verify on every request
+    app.token_cache = VerifiedTokenCache(app.config["token_cache_max_size"])
 
     yield
 
+    jwks_refresh_task.cancel()
+    revoked_tokens_sync_task.cancel()
+    await app.revoked_tokens.close()
+
+    cache_invalidation_task.cancel()
+    await cache_repository.close()
+
 
 def create_fastapi_app(settings):
-    app = FastAPI(lifespan=lifespan)
+    app = FastAPI(lifespan=lifespan, default_response_class=MongoJSONResponse)
     app.config = settings
 
     # init custom exception handler
@@ -44,6 +105,7 @@ def create_fastapi_app(settings):
 
     # init apis
     init_healthcheck_api(app)
+    init_metrics_api(app)
     init_articles_api(app)
 
     return app
\ No newline at end of file
@@ -1,8 +1,9 @@
-from fastapi import Request, Depends
+from fastapi import Request, Depends, Response
 
 from src.models.articles import ArticleCreateModel, ArticleUpdateModel
-from src.models import QueryParamsModel, to_jsonable
+from src.models import QueryParamsModel
 
+from src.api.responses import MongoJSONResponse
 from src.security.auth import authenticate_and_authorize
 
 
@@ -41,11 +42,9 @@ def init_articles_api(app):
             request: Request,
             article_id: str, current_user = Depends(authenticate_and_authorize)
     ):
-        article = await request.app.article_service.get_article(article_id)
-        payload = article.model_dump()
-        # Note this id complexity caused by pydantic
-        payload["_id"] = article._id
-        return payload
+        body = await request.app.article_service.get_article_body(article_id)
+        # body cached pre-encoded, no model is built on a cache hit
+        return Response(content=body, media_type="application/json")
 
     @app.post("/api/v1/articles/query", status_code=200)
     async def query_articles(
@@ -54,4 +53,5 @@ def init_articles_api(app):
     ):
         documents = await request.app.article_service.query_articles(query_params)
 
-        return to_jsonable(documents)
\ No newline at end of file
+        # returned as a response so fastapi skips jsonable_encoder
+        return MongoJSONResponse(documents)
\ No newline at end of file
@@ -0,0 +1,16 @@
+from fastapi import Request
+
+
+def init_metrics_api(app):
+    @app.get("/api/v1/metrics")
+    async def metrics(request: Request):
+        # in-process counters of this worker, no keys or ids since
+        # the endpoint is unauthenticated
+        # useful to see how much work caches are saving
+        return {
+            "token_cache": request.app.token_cache.stats(),
+            "revoked_tokens": request.app.revoked_tokens.stats(),
+            "single_flight": request.app.single_flight.stats(),
+            "l1_cache": request.app.cache_repository.local_stats(),
+            "shared_cache": request.app.cache_repository.shared_stats(),
+        }
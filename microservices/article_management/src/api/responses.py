@@ -0,0 +1,14 @@
+from fastapi.responses import JSONResponse
+
+from src.models import dump_json
+
+
+class MongoJSONResponse(JSONResponse):
+    """
+    Default response class, encodes in one orjson pass
+    - ObjectId, Decimal128, Decimal and datetime are handled natively so
+      routes return mongo documents without jsonable_encoder
+    """
+
+    def render(self, content) -> bytes:
+        return dump_json(content)
@@ -1,20 +1,32 @@
 from typing import Optional, Dict, Any, List
-from datetime import datetime
-from bson import ObjectId
-from fastapi.encoders import jsonable_encoder
+from datetime import date, datetime
+from decimal import Decimal
+
+import orjson
+from bson import ObjectId, Decimal128
 
 from pydantic import Field, BaseModel
 
 MAX_BATCH_SIZE = 100
 
 
-def to_jsonable(data):
-    return jsonable_encoder(
-        data,
-        custom_encoder={
-            ObjectId: str
-        }
-    )
+def json_default(obj):
+    """Types orjson does not serialize itself, encoded as jsonable_encoder does"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        obj = obj.to_decimal()
+    if isinstance(obj, Decimal):
+        # fastapi's decimal_encoder
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError("Type %s not serializable" % type(obj))
+
+
+def dump_json(data) -> bytes:
+    """Single pass encoding of mongo documents and model dumps"""
+    return orjson.dumps(data, default=json_default, option=orjson.OPT_NON_STR_KEYS)
 
 
 class PyObjectId(ObjectId):
@@ -45,4 +57,6 @@ class QueryParamsModel(BaseModel):
     filter: Optional[Dict[str, Any]] = None
     sort_by: Optional[str] = None
     sort_dir: Optional[int] = 1
-    select: Optional[List[str]] = None 
+    select: Optional[List[str]] = None
+    # next_cursor of previous page, pages by (sort_by, _id) range instead of skip
+    cursor: Optional[str] = None
@@ -3,37 +3,46 @@ import json
 from typing import Optional, Dict, Any
 from decimal import Decimal
 
-from fastapi.encoders import jsonable_encoder
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId, Decimal128
+from pymongo import ReturnDocument
+from pymongo.results import UpdateResult
 from src.models.articles import ArticleModel
+from src.models import dump_json
+from src.repositories.keyset import encode_cursor, is_projected, keyset_filter, keyset_sort, strip_field
+from src.repositories.single_flight import SingleFlight
 
 
-# TTLs in seconds
+# TTLs in seconds, hard expiry
 ENTITY_TTL = 300        # cached single-article (5 minutes)
 QUERY_TTL = 30          # cached query results (30 seconds)
+# after soft TTL cached value is served stale while one worker reloads it
+ENTITY_SOFT_TTL = 240
+QUERY_SOFT_TTL = 20
 
+# bumped on every write, query keys embed it
+QUERY_NAMESPACE = "article:query"
+
+
+def _response_body(model: ArticleModel, _id: str) -> bytes:
+    """GET response of the article, cached so hits skip pydantic and re-encoding"""
+    payload = model.model_dump()
+    # Note this id complexity caused by pydantic
+    payload["_id"] = _id
+    # same encoding MongoJSONResponse applies
+    return dump_json(payload)
+
+
+def _model_from_body(body: bytes) -> ArticleModel:
+    doc = json.loads(body)
+    _id = doc.pop("_id")
+    doc.pop("id", None)
+    if "star_ratio" in doc:
+        doc["star_ratio"] = Decimal(str(doc["star_ratio"]))
+    model = ArticleModel(**doc)
+    model._id = _id
+    return model
 
-def _normalize_for_cache(doc: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Convert non-JSON serializable types into JSON-friendly ones
-    - ObjectId -> str
-    - Decimal128 -> float (or str if you prefer)
-    """
-    if not doc:
-        return doc
-
-    out = {}
-    for k, v in doc.items():
-        if isinstance(v, ObjectId):
-            out[k] = str(v)
-        elif isinstance(v, Decimal128):
-            out[k] = float(v.to_decimal())
-        elif isinstance(v, Decimal):
-            out[k] = float(v)
-        else:
-            out[k] = v
-    return out
 
 def _prepare_doc_for_model(doc) -> Dict[str, Any]:
     """
@@ -51,6 +60,13 @@ def _prepare_doc_for_model(doc) -> Dict[str, Any]:
 
     return doc
 
+def _update_result(doc) -> UpdateResult:
+    # service layer expects update_one's result, updated_at is set on
+    # every update so a matched document is always a modified one
+    matched = 1 if doc else 0
+    return UpdateResult({"n": matched, "nModified": matched, "updatedExisting": bool(doc)}, acknowledged=True)
+
+
 def fingerprint(key_data: dict) -> str:
     """Stable hash for query cache keys."""
     raw = json.dumps(key_data, sort_keys=True, default=str)
@@ -58,44 +74,70 @@ def fingerprint(key_data: dict) -> str:
 
 
 class ArticleRepository:
-    def __init__(self, db: AsyncIOMotorDatabase, cache):
+    def __init__(self, db: AsyncIOMotorDatabase, cache, write_through: bool = False, single_flight=None):
         self.collection = db["articles"]
         self.cache = cache
+        # concurrent reads of same key share one cache/db round trip
+        self.single_flight = single_flight or SingleFlight()
+        # cache entity from written document so read after write is a hit
+        self.write_through = write_through
+
+    async def _cache_entity(self, doc) -> bytes:
+        doc = _prepare_doc_for_model(dict(doc))
+        # todo fix this weird approach caused by pydantic :/
+        _id = doc.pop("id")
+        body = _response_body(ArticleModel(**doc), _id)
+        await self.cache.set(f"article:id:{_id}", body, ttl=ENTITY_TTL, soft_ttl=ENTITY_SOFT_TTL)
+        return body
 
     async def create(self, article_doc):
         result = await self.collection.insert_one(article_doc)
-        await self.cache.delete_pattern("article:query:*")
-        # todo maybe consider caching after create
+        await self.cache.bump_generation(QUERY_NAMESPACE)
+        if self.write_through:
+            # insert_one adds _id to the inserted doc
+            await self._cache_entity(article_doc)
         return result
 
     async def get_by_id(self, article_id: str) -> Optional[ArticleModel]:
+        body = await self.get_body(article_id)
+        if body is None:
+            return None
+        return _model_from_body(body)
+
+    async def get_body(self, article_id: str) -> Optional[bytes]:
+        """Cached GET response body, pydantic runs only on misses."""
+        return await self.single_flight.do(f"article:id:{article_id}", lambda: self._get_body(article_id))
+
+    async def _get_body(self, article_id: str) -> Optional[bytes]:
         cache_key = f"article:id:{article_id}"
-        cached = await self.cache.get(cache_key)
-        if cached:
-            cached = dict(cached)
-            if "star_ratio" in cached:
-                try:
-                    cached["star_ratio"] = Decimal(str(cached["star_ratio"])) # noqa
-                except KeyError:
-                    pass
-            return ArticleModel(**cached)
+        cached = await self.cache.get(cache_key, refresh=lambda: self._find_by_id(article_id))
+        # entries cached as documents or str bodies, before bytes were, are reloaded
+        if isinstance(cached, bytes):
+            return cached
 
+        return await self._find_by_id(article_id)
+
+    async def _find_by_id(self, article_id: str) -> Optional[bytes]:
         doc = await self.collection.find_one({"_id": ObjectId(article_id)})
         if not doc:
             return None
 
-        doc = _prepare_doc_for_model(doc)
-        # todo fix this weird approach caused by pydantic :/
-        _id = doc.pop("id")
-        model = ArticleModel(**doc)
-        model._id = _id
-        await self.cache.set(cache_key, _normalize_for_cache(jsonable_encoder(model)), ttl=ENTITY_TTL)
-        return model
+        return await self._cache_entity(doc)
 
     async def update(self, update_payload, article_id: str):
-        updated = await self.collection.update_one({"_id": ObjectId(article_id)}, {"$set": update_payload})
-        await self.cache.delete(f"article:id:{article_id}")
-        await self.cache.delete_pattern("article:query:*")
+        if self.write_through:
+            doc = await self.collection.find_one_and_update(
+                {"_id": ObjectId(article_id)}, {"$set": update_payload}, return_document=ReturnDocument.AFTER
+            )
+            # reports modified == matched, the service's "no changes" 409
+            # relies on it and holds since service always sets updated_at
+            updated = _update_result(doc)
+            if doc:
+                await self._cache_entity(doc)
+        else:
+            updated = await self.collection.update_one({"_id": ObjectId(article_id)}, {"$set": update_payload})
+            await self.cache.delete(f"article:id:{article_id}")
+        await self.cache.bump_generation(QUERY_NAMESPACE)
 
         return updated
 
@@ -103,10 +145,10 @@ class ArticleRepository:
         result = await self.collection.delete_one({"_id": ObjectId(article_id)})
 
         await self.cache.delete(f"article:id:{article_id}")
-        await self.cache.delete_pattern("article:query:*")
+        await self.cache.bump_generation(QUERY_NAMESPACE)
         return result
 
-    async def query(self, skip, limit, _filter, sort_by, sort_dir, select):
+    async def query(self, skip, limit, _filter, sort_by, sort_dir, select, after=None):
         key_data = {
             "skip": skip,
             "limit": limit,
@@ -114,13 +156,28 @@ class ArticleRepository:
             "sort_by": sort_by,
             "sort_dir": sort_dir,
             "select": select,
+            "after": after,
         }
-        cache_key = f"article:query:{fingerprint(key_data)}"
+        query_fingerprint = fingerprint(key_data)
+        return await self.single_flight.do(
+            f"{QUERY_NAMESPACE}:{query_fingerprint}",
+            lambda: self._query(query_fingerprint, skip, limit, _filter, sort_by, sort_dir, select, after)
+        )
+
+    async def _query(self, query_fingerprint, skip, limit, _filter, sort_by, sort_dir, select, after):
+        generation = await self.cache.get_generation(QUERY_NAMESPACE)
+        cache_key = f"{QUERY_NAMESPACE}:{generation}:{query_fingerprint}"
 
         # check cache
-        cached = await self.cache.get(cache_key)
+        cached = await self.cache.get(
+            cache_key, refresh=lambda: self._query_db(cache_key, skip, limit, _filter, sort_by, sort_dir, select, after)
+        )
         if cached:
             return cached
+
+        return await self._query_db(cache_key, skip, limit, _filter, sort_by, sort_dir, select, after)
+
+    async def _query_db(self, cache_key, skip, limit, _filter, sort_by, sort_dir, select, after):
         
         mongo_filter = {}
 
@@ -130,23 +187,36 @@ class ArticleRepository:
                 for key, value in _filter.items()
             }
 
+        if after is not None:
+            # range on (sort_by, _id) instead of walking skipped documents
+            after_filter = keyset_filter(sort_by, sort_dir, *after)
+            mongo_filter = {"$and": [mongo_filter, after_filter]} if mongo_filter else after_filter
+
         projection = None
+        unselected_sort_key = False
         if select:
             projection = {field: 1 for field in select}
             if "id" in projection and "_id" not in projection:
                 projection["_id"] = 1
                 del projection["id"]
+            # sort key is needed to build next cursor
+            unselected_sort_key = sort_by and sort_by != "_id" and not is_projected(sort_by, projection)
+            if unselected_sort_key:
+                projection[sort_by] = 1
 
         cursor = self.collection.find(mongo_filter, projection=projection)
-
-        if sort_by:
-            cursor = cursor.sort(sort_by, sort_dir)
-
+        cursor = cursor.sort(keyset_sort(sort_by, sort_dir))
         cursor = cursor.skip(skip).limit(limit)
 
         docs = await cursor.to_list(length=limit)
 
-        payload = {"count": len(docs), "docs": docs}
-        await self.cache.set(cache_key, payload, ttl=QUERY_TTL)
+        # full page, more documents may follow
+        next_cursor = encode_cursor(sort_by, sort_dir, docs[-1]) if docs and len(docs) == limit else None
+        if unselected_sort_key:
+            for doc in docs:
+                strip_field(doc, sort_by)
+
+        payload = {"count": len(docs), "docs": docs, "next_cursor": next_cursor}
+        await self.cache.set(cache_key, payload, ttl=QUERY_TTL, soft_ttl=QUERY_SOFT_TTL)
         
         return payload
@@ -0,0 +1,85 @@
+import base64
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId, json_util
+
+
+def _descending(sort_dir: Optional[int]) -> bool:
+    return sort_dir == -1
+
+
+def _field_value(doc: Dict[str, Any], field: str) -> Any:
+    value = doc
+    for part in field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def keyset_sort(sort_by: Optional[str], sort_dir: Optional[int]) -> List[Tuple[str, int]]:
+    """Sort of a keyset page, _id breaks ties so every document has one position"""
+    direction = -1 if _descending(sort_dir) else 1
+    if not sort_by or sort_by == "_id":
+        return [("_id", direction)]
+    return [(sort_by, direction), ("_id", direction)]
+
+
+def keyset_filter(sort_by: Optional[str], sort_dir: Optional[int], last_value: Any, last_id: ObjectId) -> Dict:
+    """Documents positioned after (last_value, last_id) in keyset_sort order"""
+    op = "$lt" if _descending(sort_dir) else "$gt"
+    if not sort_by or sort_by == "_id":
+        return {"_id": {op: last_id}}
+    tie = {sort_by: last_value, "_id": {op: last_id}}
+    if last_value is not None:
+        if _descending(sort_dir):
+            # null/missing values sort last and comparisons never match them
+            return {"$or": [{sort_by: {op: last_value}}, {sort_by: None}, tie]}
+        return {"$or": [{sort_by: {op: last_value}}, tie]}
+    # null/missing values sort first, comparisons with null match nothing
+    if _descending(sort_dir):
+        return tie
+    return {"$or": [{sort_by: {"$ne": None}}, tie]}
+
+
+def is_projected(sort_by: str, projection: Dict[str, int]) -> bool:
+    """Whether an inclusion projection returns sort_by, itself or inside a selected parent"""
+    return any(sort_by == field or sort_by.startswith(field + ".") for field in projection)
+
+
+def strip_field(doc: Dict[str, Any], field: str) -> None:
+    """Removes field, dotted paths included, and the parents it leaves empty"""
+    parts = field.split(".")
+    parents = [doc]
+    for part in parts[:-1]:
+        child = parents[-1].get(part)
+        if not isinstance(child, dict):
+            return
+        parents.append(child)
+    parents[-1].pop(parts[-1], None)
+    for parent, part in zip(reversed(parents[:-1]), reversed(parts[:-1])):
+        if parent[part]:
+            break
+        del parent[part]
+
+
+def encode_cursor(sort_by: Optional[str], sort_dir: Optional[int], doc: Dict[str, Any]) -> str:
+    """Opaque cursor pointing after doc, bound to the sort it was built for"""
+    last_value = _field_value(doc, sort_by) if sort_by and sort_by != "_id" else None
+    # extended json keeps datetime, ObjectId and Decimal128 types
+    raw = json_util.dumps([sort_by, -1 if _descending(sort_dir) else 1, last_value, doc["_id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: Optional[str], sort_dir: Optional[int]) -> Tuple[Any, ObjectId]:
+    """(last_value, last_id) of cursor, ValueError if it is malformed or built for another sort"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort_by, cursor_sort_dir, last_value, last_id = json_util.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("malformed cursor")
+    if cursor_sort_by != sort_by or cursor_sort_dir != (-1 if _descending(sort_dir) else 1):
+        raise ValueError("cursor was built for another sort")
+    if not isinstance(last_id, ObjectId):
+        raise ValueError("malformed cursor")
+    return last_value, last_id
@@ -0,0 +1,79 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class LocalCache:
+    """
+    In-process L1 LRU in front of redis, holds decoded values
+    - bounded by entry count and by size of the json they were decoded from
+    - an entry is served only until its fresh_until (wall clock), stale
+      values go back to redis so stale-while-revalidate still applies
+    - values are shared between callers and must not be mutated
+    - kept coherent by invalidation messages, a fill racing with an
+      invalidation is dropped using invalidation sequence number
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.invalidation_seq = 0
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: str, value: Any, fresh_until: float, size: int, seq: int) -> None:
+        # invalidated while value was read from redis, may be stale
+        if seq != self.invalidation_seq or size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, fresh_until, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def invalidate(self, *keys: str) -> None:
+        self.invalidation_seq += 1
+        for key in keys:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        self.invalidation_seq += 1
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
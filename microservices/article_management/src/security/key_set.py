@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa, ec, ed25519
+from jwt import PyJWK
+from jwt.algorithms import get_default_algorithms
+
+from src.security.exceptions import AppException
+
+logger = logging.getLogger(__name__)
+
+# unknown kid triggers a refresh at most this often (seconds)
+# so forged kids can not be used to flood IAM
+UNKNOWN_KID_REFRESH_INTERVAL = 30
+
+
+def _algorithm_for(public_key):
+    # same mapping IAM signs with
+    if isinstance(public_key, ed25519.Ed25519PublicKey):
+        return "EdDSA"
+    if isinstance(public_key, ec.EllipticCurvePublicKey) and isinstance(public_key.curve, ec.SECP256R1):
+        return "ES256"
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return "RS256"
+    raise ValueError("unsupported key type {}".format(type(public_key).__name__))
+
+
+class JwksKeySet:
+    """
+    Locally cached copy of IAM's public keys
+    - keys are selected by the kid header of the token
+    - refreshed in background so IAM can rotate keys without restarts
+    - static public key file is used for tokens without kid
+    """
+
+    def __init__(self, jwks_url=None, public_key_path=None, refresh_interval=300):
+        self.jwks_url = jwks_url
+        self.refresh_interval = refresh_interval
+        self._keys = {}
+        self._last_refresh = 0
+        self._static_key = None
+
+        if public_key_path:
+            with open(public_key_path, "rb") as f:
+                public_key = serialization.load_pem_public_key(f.read())
+            algorithm = _algorithm_for(public_key)
+            jwk = get_default_algorithms()[algorithm].to_jwk(public_key, as_dict=True)
+            self._static_key = PyJWK(jwk, algorithm=algorithm)
+
+    async def refresh(self):
+        if not self.jwks_url:
+            return
+        self._last_refresh = time.monotonic()
+        async with aiohttp.ClientSession() as session:
+            async with session.get(self.jwks_url) as response:
+                response.raise_for_status()
+                jwks = await response.json()
+
+        keys = {}
+        for jwk in jwks.get("keys", []):
+            # algorithm is pinned by IAM per key, never taken from the token
+            keys[jwk["kid"]] = PyJWK(jwk, algorithm=jwk["alg"])
+        self._keys = keys
+
+    async def run_refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as exc:
+                # keep serving with last known keys
+                logger.warning("jwks refresh failed: {}".format(exc))
+
+    async def get(self, kid):
+        if kid is None and self._static_key:
+            return self._static_key
+
+        key = self._keys.get(kid)
+        if key is None and time.monotonic() - self._last_refresh > UNKNOWN_KID_REFRESH_INTERVAL:
+            # probably a freshly rotated key
+            try:
+                await self.refresh()
+            except Exception as exc:
+                logger.warning("jwks refresh failed: {}".format(exc))
+            key = self._keys.get(kid)
+
+        if key is None:
+            raise AppException(
+                error_message="unknown signing key",
+                error_code="exceptions.unknownSigningKey",
+                status_code=401
+            )
+        return key
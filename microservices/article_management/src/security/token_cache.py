@@ -0,0 +1,61 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from src.security.permissions import CompiledPermissions
+
+
+class VerifiedTokenCache:
+    """
+    In-process LRU cache of already verified jwt claims
+    and their compiled permissions
+    - keyed by sha256 of the raw token so tokens are not kept in memory
+    - every entry is dropped at the token's exp claim
+    - bounded by max_size, least recently used entry evicted first
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], CompiledPermissions]]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Tuple[Dict[str, Any], CompiledPermissions]]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry[0]["exp"] <= time.time():
+            # token expired while cached, force a real verify
+            # so caller gets the proper ExpiredSignatureError
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, token: str, claims: Dict[str, Any], permissions: CompiledPermissions) -> None:
+        if self.max_size <= 0 or "exp" not in claims:
+            return
+        key = self._key(token)
+        self._entries[key] = (claims, permissions)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
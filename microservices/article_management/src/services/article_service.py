@@ -5,6 +5,7 @@ from bson import Decimal128
 from src.repositories.article_repository import ArticleRepository
 from src.models.articles import ArticleCreateModel, ArticleModel, ArticleUpdateModel
 from src.models.users import UserModel
+from src.repositories.keyset import decode_cursor
 from src.security.exceptions import AppException
 
 
@@ -40,6 +41,16 @@ class ArticleService:
         article._id = article_id
         return article
 
+    async def get_article_body(self, article_id: str) -> bytes:
+        body = await self.repo.get_body(article_id)
+        if body is None:
+            raise AppException(
+                error_message="article not found",
+                error_code="exceptions.articleNotFound",
+                status_code=404
+            )
+        return body
+
     async def update_article(self, update_payload: ArticleUpdateModel, article_id: str, current_user:UserModel):
         update_payload = update_payload.model_dump(exclude_unset=True)
         update_payload["updated_by"] = current_user.id.hex
@@ -64,8 +75,24 @@ class ArticleService:
         return {}
 
     async def query_articles(self, query_parameters):
+        after = None
+        if query_parameters.cursor:
+            if query_parameters.skip:
+                raise AppException(
+                    error_message="skip can not be combined with cursor",
+                    error_code="exceptions.invalidCursor",
+                    status_code=400
+                )
+            try:
+                after = decode_cursor(query_parameters.cursor, query_parameters.sort_by, query_parameters.sort_dir)
+            except ValueError:
+                raise AppException(
+                    error_message="invalid cursor",
+                    error_code="exceptions.invalidCursor",
+                    status_code=400
+                )
         result = await self.repo.query(
             query_parameters.skip, query_parameters.limit, query_parameters.filter,
-            query_parameters.sort_by, query_parameters.sort_dir, query_parameters.select
+            query_parameters.sort_by, query_parameters.sort_dir, query_parameters.select, after
         )
         return result
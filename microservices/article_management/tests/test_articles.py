@@ -1,6 +1,14 @@
+import asyncio
+import json
 import pytest
 import jwt
 import uuid
+import calendar
+import multiprocessing
+import os
+import time
+import redis.asyncio
+from bson import ObjectId
 from datetime import datetime, timedelta
 from cryptography.hazmat.primitives import serialization
 
@@ -8,6 +16,11 @@ from fastapi.testclient import TestClient
 
 from src import create_fastapi_app
 from configs.test import test_config
+from src.repositories.cache_codec import CacheCodec, FORMAT_ORJSON, FORMAT_RAW
+from src.security.exceptions import AppException
+from src.security.permission_registry import PermissionRegistry
+from src.security.permissions import CompiledPermissions
+from src.repositories.shared_cache import SharedMemoryCache, _key_hash
 
 @pytest.fixture
 def client():
@@ -234,6 +247,14 @@ async def test_success_article_query(client):
         # ensure filtering works properly
         assert all([True for doc in query_body["docs"] if doc.get("status") == "published"])
 
+        # full documents, Decimal128 star_ratio included, are encoded too
+        article_query_payload = {"filter": {"title": "Buridan’s Principle"}, "limit": 1}
+        response = client.post("api/v1/articles/query", json=article_query_payload, headers=headers)
+        assert response.status_code == 200
+        doc = response.json()["docs"][0]
+        assert doc["star_ratio"] == 0.0
+        assert isinstance(doc["_id"], str)
+
 @pytest.mark.asyncio
 async def test_success_article_get_cache(client):
     with client as client:
@@ -278,6 +299,14 @@ async def test_success_article_get_cache(client):
 
         assert db_get_response_body == cache_get_response_body
 
+        # body built on a miss is returned byte for byte on hits
+        client.portal.call(client.app.cache_repository.delete, f"article:id:{body["_id"]}")
+        miss_response = client.get(f"api/v1/articles/{body["_id"]}", headers=headers)
+        hit_response = client.get(f"api/v1/articles/{body["_id"]}", headers=headers)
+        assert hit_response.headers["content-type"] == "application/json"
+        assert miss_response.content == hit_response.content
+        assert hit_response.json()["_id"] == body["_id"]
+
 @pytest.mark.asyncio
 async def test_success_article_query_cache(client):
     with client as client:
@@ -396,3 +425,505 @@ async def test_success_article_update_cache(client):
 
         assert after_update_get_response_body["status"] == "published"
         assert after_update_get_response_body != before_update_get_response_body
+
+@pytest.mark.asyncio
+async def test_success_article_write_through_cache(client):
+    with client as client:
+        article_create_payload = {
+            "title": "The Part-Time Parliament",
+            "author": "Leslie Lamport",
+            "article_content": "https://dummy.cloudfront.net/assets/example4.pdf",
+            "publish_date": "1998-05-01T00:00:00Z",
+            "status": "draft"
+        }
+        token, token_payload = create_test_jwt(
+            client.app.config["test_encryption_file_path"],
+            ["create_article", "update_article", "get_article"]
+        )
+        headers = {
+            "Authorization": "Bearer " + token
+        }
+        response = client.post("api/v1/articles", json=article_create_payload, headers=headers)
+        assert response.status_code == 201
+        article_id = response.json()["_id"]
+
+        response = client.put(f"api/v1/articles/{article_id}", json={"status": "published"}, headers=headers)
+        assert response.status_code == 201
+
+        # removed behind the cache's back, get is served from entity cache written by update
+        client.portal.call(client.app.db["articles"].delete_one, {"_id": ObjectId(article_id)})
+        response = client.get(f"api/v1/articles/{article_id}", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["status"] == "published"
+        assert response.json()["title"] == article_create_payload["title"]
+
+@pytest.mark.asyncio
+async def test_success_article_stale_while_revalidate(client):
+    with client as client:
+        article_create_payload = {
+            "title": "Paxos Made Simple",
+            "author": "Leslie Lamport",
+            "article_content": "https://dummy.cloudfront.net/assets/example5.pdf",
+            "publish_date": "2001-11-01T00:00:00Z",
+            "status": "published"
+        }
+        token, token_payload = create_test_jwt(
+            client.app.config["test_encryption_file_path"],
+            ["create_article", "get_article"]
+        )
+        headers = {
+            "Authorization": "Bearer " + token
+        }
+        response = client.post("api/v1/articles", json=article_create_payload, headers=headers)
+        assert response.status_code == 201
+        article_id = response.json()["_id"]
+        response = client.get(f"api/v1/articles/{article_id}", headers=headers)
+        assert response.status_code == 200
+
+        # changed behind the cache's back and cached entry made stale
+        client.portal.call(
+            client.app.db["articles"].update_one, {"_id": ObjectId(article_id)}, {"$set": {"title": "Paxos Made Live"}}
+        )
+        redis_client = redis.asyncio.from_url(client.app.config["redis_connection_string"])
+        cache_key = f"article:id:{article_id}"
+        codec = CacheCodec()
+        envelope = codec.decode(client.portal.call(redis_client.get, cache_key))
+        envelope["fresh_until"] = 0
+        client.portal.call(redis_client.set, cache_key, codec.encode(envelope))
+        # as every cache write does, so workers drop their L1 copy
+        client.portal.call(redis_client.publish, "cache:invalidate", json.dumps([cache_key]))
+        client.portal.call(asyncio.sleep, 0.1)
+
+        # stale value served right away, reloaded in background
+        response = client.get(f"api/v1/articles/{article_id}", headers=headers)
+        assert response.json()["title"] == "Paxos Made Simple"
+        client.portal.call(asyncio.sleep, 0.1)
+
+        response = client.get(f"api/v1/articles/{article_id}", headers=headers)
+        assert response.json()["title"] == "Paxos Made Live"
+
+        # value cached before envelopes existed is a miss and refilled
+        client.portal.call(
+            client.app.db["articles"].update_one, {"_id": ObjectId(article_id)}, {"$set": {"title": "Paxos"}}
+        )
+        client.portal.call(redis_client.set, cache_key, json.dumps({"_id": article_id, "title": "Paxos Made Live"}))
+        client.portal.call(redis_client.publish, "cache:invalidate", json.dumps([cache_key]))
+        client.portal.call(asyncio.sleep, 0.1)
+        response = client.get(f"api/v1/articles/{article_id}", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["title"] == "Paxos"
+        assert "fresh_until" in codec.decode(client.portal.call(redis_client.get, cache_key))
+
+@pytest.mark.asyncio
+async def test_success_article_get_single_flight(client):
+    with client as client:
+        article_create_payload = {
+            "title": "Impossibility of Distributed Consensus with One Faulty Process",
+            "author": "Fischer, Lynch, Paterson",
+            "article_content": "https://dummy.cloudfront.net/assets/example6.pdf",
+            "publish_date": "1985-04-01T00:00:00Z",
+            "status": "published"
+        }
+        token, token_payload = create_test_jwt(client.app.config["test_encryption_file_path"], ["create_article"])
+        headers = {
+            "Authorization": "Bearer " + token
+        }
+        response = client.post("api/v1/articles", json=article_create_payload, headers=headers)
+        assert response.status_code == 201
+        article_id = response.json()["_id"]
+
+        async def get_concurrently():
+            return await asyncio.gather(*[client.app.article_service.get_article(article_id) for _ in range(5)])
+
+        articles = client.portal.call(get_concurrently)
+        assert all(article.title == article_create_payload["title"] for article in articles)
+
+        # one caller loaded, other four awaited its result
+        single_flight = client.get("api/v1/metrics").json()["single_flight"]
+        assert single_flight["coalesced"] == 4
+        # keys carry entity ids, only counters are served
+        assert "top_coalesced_keys" not in single_flight
+        assert client.app.single_flight.top_coalesced_keys() == {f"article:id:{article_id}": 4}
+
+@pytest.mark.asyncio
+async def test_success_article_l1_cache(client):
+    with client as client:
+        article_create_payload = {
+            "title": "Viewstamped Replication",
+            "author": "Brian Oki, Barbara Liskov",
+            "article_content": "https://dummy.cloudfront.net/assets/example7.pdf",
+            "publish_date": "1988-08-01T00:00:00Z",
+            "status": "draft"
+        }
+        token, token_payload = create_test_jwt(
+            client.app.config["test_encryption_file_path"],
+            ["create_article", "update_article", "get_article"]
+        )
+        headers = {
+            "Authorization": "Bearer " + token
+        }
+        response = client.post("api/v1/articles", json=article_create_payload, headers=headers)
+        article_id = response.json()["_id"]
+        # wait for invalidation subscription, L1 is bypassed until then
+        client.portal.call(asyncio.sleep, 0.1)
+
+        client.get(f"api/v1/articles/{article_id}", headers=headers)
+        hits_before = client.get("api/v1/metrics").json()["l1_cache"]["hits"]
+        response = client.get(f"api/v1/articles/{article_id}", headers=headers)
+        assert response.json()["status"] == "draft"
+        assert client.get("api/v1/metrics").json()["l1_cache"]["hits"] == hits_before + 1
+
+        # write drops L1 copy
+        response = client.put(f"api/v1/articles/{article_id}", json={"status": "published"}, headers=headers)
+        assert response.status_code == 201
+        response = client.get(f"api/v1/articles/{article_id}", headers=headers)
+        assert response.json()["status"] == "published"
+
+@pytest.mark.asyncio
+async def test_success_article_query_cache_invalidated_on_create(client):
+    with client as client:
+        token, token_payload = create_test_jwt(
+            client.app.config["test_encryption_file_path"],
+            ["create_article", "query_articles"]
+        )
+        headers = {
+            "Authorization": "Bearer " + token
+        }
+        title = f"Time, Clocks, and the Ordering of Events {uuid.uuid4().hex}"
+        article_query_payload = {"filter": {"title": title}, "select": ["_id"]}
+
+        response = client.post("api/v1/articles/query", json=article_query_payload, headers=headers)
+        assert response.status_code == 200
+        assert response.json()["count"] == 0
+
+        article_create_payload = {
+            "title": title,
+            "author": "Leslie Lamport",
+            "article_content": "https://dummy.cloudfront.net/assets/example3.pdf",
+            "publish_date": "1978-07-01T00:00:00Z",
+            "status": "published"
+        }
+        response = client.post("api/v1/articles", json=article_create_payload, headers=headers)
+        assert response.status_code == 201
+
+        # create bumped query generation, cached empty result is not served
+        response = client.post("api/v1/articles/query", json=article_query_payload, headers=headers)
+        assert response.status_code == 200
+        assert response.json()["count"] == 1
+
+def test_success_shared_memory_cache(tmp_path):
+    # two instances on one file stand for two worker processes
+    path = str(tmp_path / "shared_cache")
+    first = SharedMemoryCache(path, size=1024 * 1024, slot_count=64)
+    second = SharedMemoryCache(path, size=1024 * 1024, slot_count=64)
+    try:
+        fresh_until = time.time() + 60
+        first.set("article:1", b'{"value": 1}', fresh_until, first.seq_of("article:1"))
+        assert second.get("article:1") == (b'{"value": 1}', fresh_until)
+
+        # set started before an invalidation is dropped
+        seq = first.seq_of("article:1")
+        second.invalidate("article:1")
+        assert first.get("article:1") is None
+        first.set("article:1", b'{"value": 2}', fresh_until, seq)
+        assert second.get("article:1") is None
+
+        # invalidation of a key in another set does not drop the fill
+        other_key = next(
+            key for key in (f"article:{i}" for i in range(3, 100))
+            if first._set_of(_key_hash(key.encode())) != first._set_of(_key_hash(b"article:1"))
+        )
+        seq = first.seq_of("article:1")
+        second.invalidate(other_key)
+        first.set("article:1", b'{"value": 2}', fresh_until, seq)
+        assert second.get("article:1") == (b'{"value": 2}', fresh_until)
+
+        # expired entries are not served
+        first.set("article:2", b'{"value": 3}', time.time() - 1, first.seq_of("article:2"))
+        assert second.get("article:2") is None
+
+        # other layout gets its own file, mapped one is left intact
+        open(path + ".0badf00d", "wb").close()
+        third = SharedMemoryCache(path, size=2 * 1024 * 1024, slot_count=64)
+        assert third.path != first.path
+        assert third.get("article:1") is None
+        assert first.get("article:1") == (b'{"value": 2}', fresh_until)
+        # files of layouts nobody uses are removed
+        assert not os.path.exists(path + ".0badf00d")
+        third.close()
+    finally:
+        first.close()
+        second.close()
+
+def _attach_shared_memory_cache(path, attached, release):
+    cache = SharedMemoryCache(path, size=1024 * 1024, slot_count=64)
+    cache.attach()
+    attached.set()
+    release.wait(10)
+    cache.close()
+
+def test_success_shared_memory_cache_attach(tmp_path):
+    path = str(tmp_path / "shared_cache")
+    context = multiprocessing.get_context("fork")
+    attached, release = context.Event(), context.Event()
+    sibling = context.Process(target=_attach_shared_memory_cache, args=(path, attached, release))
+    sibling.start()
+    cache = SharedMemoryCache(path, size=1024 * 1024, slot_count=64)
+    try:
+        assert attached.wait(10)
+        # a subscribed sibling kept the segment coherent, no clear needed
+        assert not cache.attach()
+        cache.detach()
+        release.set()
+        sibling.join(10)
+        # nobody subscribed, invalidations may have been missed
+        assert cache.attach()
+    finally:
+        release.set()
+        cache.close()
+
+def test_success_cache_codec():
+    value = {"value": {"_id": "1", "article_content": "replication " * 200}, "fresh_until": 1.5}
+    for compression in (None, "zstd", "lz4"):
+        codec = CacheCodec(compression, compression_threshold=1024)
+        data = codec.encode(value)
+        assert codec.decode(data) == value
+        # every codec reads every format during rollout
+        assert CacheCodec().decode(data) == value
+        if compression:
+            assert len(data) < len(json.dumps(value))
+    # small values are not compressed
+    assert CacheCodec("zstd").encode({"value": 1})[0] == FORMAT_ORJSON
+    # values written before the codec existed
+    assert CacheCodec().decode(json.dumps(value).encode()) == value
+    # encoded response bodies are kept as bytes, not as escaped json strings
+    body = json.dumps(value["value"]).encode()
+    for compression in (None, "zstd", "lz4"):
+        data = CacheCodec(compression, compression_threshold=1024).encode({"value": body, "fresh_until": 1.5})
+        assert data[0] == FORMAT_RAW if compression is None else data[0] != FORMAT_RAW
+        assert CacheCodec().decode(data) == {"value": body, "fresh_until": 1.5}
+    assert CacheCodec().encode({"value": body, "fresh_until": 1.5})[9:] == body
+
+@pytest.mark.asyncio
+async def test_success_article_query_cursor_pagination():
+    # error responses are asserted so server exceptions must not be raised
+    with TestClient(create_fastapi_app(test_config), raise_server_exceptions=False) as client:
+        token, token_payload = create_test_jwt(
+            client.app.config["test_encryption_file_path"],
+            ["create_article", "query_articles"]
+        )
+        headers = {
+            "Authorization": "Bearer " + token
+        }
+        author = f"Jim Gray {uuid.uuid4().hex}"
+        # two articles share a publish date, _id orders them
+        for publish_date in ("1981-01-01T00:00:00Z", "1978-01-01T00:00:00Z", "1981-01-01T00:00:00Z"):
+            article_create_payload = {
+                "title": "The Transaction Concept",
+                "author": author,
+                "article_content": "https://dummy.cloudfront.net/assets/example8.pdf",
+                "publish_date": publish_date,
+                "status": "published"
+            }
+            response = client.post("api/v1/articles", json=article_create_payload, headers=headers)
+            assert response.status_code == 201
+
+        article_query_payload = {
+            "filter": {"author": author},
+            "limit": 2,
+            "sort_by": "publish_date",
+            "sort_dir": -1,
+            "select": ["_id"]
+        }
+        response = client.post("api/v1/articles/query", json=article_query_payload, headers=headers)
+        first_page = response.json()
+        assert first_page["count"] == 2
+        assert first_page["next_cursor"]
+        # sort key is read for the cursor but not returned unless selected
+        assert all(set(doc) == {"_id"} for doc in first_page["docs"])
+
+        article_query_payload["cursor"] = first_page["next_cursor"]
+        response = client.post("api/v1/articles/query", json=article_query_payload, headers=headers)
+        second_page = response.json()
+        assert second_page["count"] == 1
+        assert second_page["next_cursor"] is None
+        ids = [doc["_id"] for doc in first_page["docs"] + second_page["docs"]]
+        assert len(set(ids)) == 3
+
+        # cursor is bound to the sort it was built for
+        article_query_payload["sort_dir"] = 1
+        response = client.post("api/v1/articles/query", json=article_query_payload, headers=headers)
+        assert response.status_code == 400
+
+        article_query_payload.update({"sort_dir": -1, "skip": 1})
+        response = client.post("api/v1/articles/query", json=article_query_payload, headers=headers)
+        assert response.status_code == 400
+
+        # null and missing sort values come last in descending order and are still reached
+        for doc in ({"publish_date": None}, {}):
+            client.portal.call(
+                client.app.db["articles"].insert_one, {"title": "Notes on Data Base Operating Systems", "author": author, **doc}
+            )
+        article_query_payload = {
+            "filter": {"author": author}, "limit": 2, "sort_by": "publish_date", "sort_dir": -1, "select": ["title"]
+        }
+        ids = []
+        while True:
+            page = client.post("api/v1/articles/query", json=article_query_payload, headers=headers).json()
+            ids += [doc["_id"] for doc in page["docs"]]
+            if not page["next_cursor"]:
+                break
+            article_query_payload["cursor"] = page["next_cursor"]
+        assert len(ids) == len(set(ids)) == 5
+
+        # dotted sort key is read for the cursor and removed with its parent
+        client.portal.call(
+            client.app.db["articles"].update_many, {"author": author}, {"$set": {"meta.rank": 1}}
+        )
+        article_query_payload = {
+            "filter": {"author": author}, "limit": 2, "sort_by": "meta.rank", "sort_dir": -1, "select": ["_id"]
+        }
+        page = client.post("api/v1/articles/query", json=article_query_payload, headers=headers).json()
+        assert page["next_cursor"]
+        assert all(set(doc) == {"_id"} for doc in page["docs"])
+
+@pytest.mark.asyncio
+async def test_success_token_cache(client):
+    with client as client:
+        token, token_payload = create_test_jwt(
+            client.app.config["test_encryption_file_path"],
+            ["query_articles"]
+        )
+        headers = {
+            "Authorization": "Bearer " + token
+        }
+        response = client.post("api/v1/articles/query", json={"select": ["_id"]}, headers=headers)
+        assert response.status_code == 200
+
+        # second request with same token must be served from verified token cache
+        response = client.post("api/v1/articles/query", json={"select": ["_id"]}, headers=headers)
+        assert response.status_code == 200
+
+        response = client.get("api/v1/metrics")
+        token_cache_stats = response.json()["token_cache"]
+
+        assert response.status_code == 200
+        assert token_cache_stats["misses"] == 1
+        assert token_cache_stats["hits"] == 1
+        assert token_cache_stats["size"] == 1
+
+@pytest.mark.asyncio
+async def test_success_wildcard_permissions():
+    # error responses are asserted so server exceptions must not be raised
+    with TestClient(create_fastapi_app(test_config), raise_server_exceptions=False) as client:
+        article_create_payload = {
+            "title": "A Relational Model of Data for Large Shared Data Banks",
+            "author": "Edgar F. Codd",
+            "article_content": "https://dummy.cloudfront.net/assets/example.pdf",
+            "publish_date": "1970-06-01T00:00:00Z",
+            "status": "draft"
+        }
+        token, token_payload = create_test_jwt(
+            client.app.config["test_encryption_file_path"],
+            ["*_article"]
+        )
+        headers = {
+            "Authorization": "Bearer " + token
+        }
+        response = client.post("api/v1/articles", json=article_create_payload, headers=headers)
+        body = response.json()
+
+        assert response.status_code == 201
+
+        response = client.get(f"api/v1/articles/{body["_id"]}", headers=headers)
+        assert response.status_code == 200
+
+        # query_articles is not covered by *_article
+        response = client.post("api/v1/articles/query", json={"select": ["_id"]}, headers=headers)
+        assert response.status_code == 403
+
+
+def test_success_compiled_permissions():
+    permissions = CompiledPermissions(["articles_*_own", "*get*", "query_*"])
+    # wildcards in the middle or on both ends are patterns, not literals
+    assert permissions.allows("articles_update_own")
+    assert not permissions.allows("articles_update")
+    assert permissions.allows("get_article")
+    assert permissions.allows("query_articles")
+    assert not permissions.allows("create_article")
+    assert not permissions.allows("articles_*_own_x")
+    # regex metacharacters in grants are literal
+    assert not CompiledPermissions(["get.*"]).allows("get_article")
+
+
+@pytest.mark.asyncio
+async def test_revoked_token_rejected():
+    # error responses are asserted so server exceptions must not be raised
+    with TestClient(create_fastapi_app(test_config), raise_server_exceptions=False) as client:
+        token, token_payload = create_test_jwt(
+            client.app.config["test_encryption_file_path"],
+            ["query_articles"]
+        )
+        headers = {
+            "Authorization": "Bearer " + token
+        }
+        response = client.post("api/v1/articles/query", json={"select": ["_id"]}, headers=headers)
+        assert response.status_code == 200
+
+        # revoke the same way IAM does
+        redis_client = redis.asyncio.from_url(client.app.config["redis_connection_string"], decode_responses=True)
+        client.portal.call(
+            redis_client.xadd, "revoked_tokens",
+            {"jti": token_payload["jti"], "exp": calendar.timegm(token_payload["exp"].utctimetuple())}
+        )
+        client.portal.call(client.app.revoked_tokens.sync)
+
+        # token is still in verified token cache but must be rejected
+        response = client.post("api/v1/articles/query", json={"select": ["_id"]}, headers=headers)
+        assert response.status_code == 401
+        assert response.json()["error_code"] == "exceptions.tokenRevoked"
+
+
+@pytest.mark.asyncio
+async def test_permission_registry_unavailable():
+    # nothing listens on discard port, every refresh fails
+    registry = PermissionRegistry("http://127.0.0.1:9/api/v1/permissions")
+    with pytest.raises(AppException) as exc_info:
+        await registry.decode("AQ", 1)
+    assert exc_info.value.status_code == 503
+
+    # retried only after backoff, requests in between fail fast
+    assert registry._next_refresh_at > time.monotonic()
+    with pytest.raises(AppException) as exc_info:
+        await registry.decode("AQ", 1)
+    assert exc_info.value.status_code == 503
+    assert registry._failures == 1
+
+
+@pytest.mark.asyncio
+async def test_static_eddsa_public_key(tmp_path):
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    private_key = ed25519.Ed25519PrivateKey.generate()
+    public_key_path = tmp_path / "encryption_public_key.pem"
+    public_key_path.write_bytes(private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ))
+    app = create_fastapi_app({**test_config, "encryption_file_path": str(public_key_path)})
+    with TestClient(app, raise_server_exceptions=False) as client:
+        # algorithm follows the key type, not fixed to RS256
+        assert client.app.key_set._static_key.algorithm_name == "EdDSA"
+        token = jwt.encode(
+            payload={
+                "iat": datetime.utcnow(),
+                "exp": datetime.utcnow() + timedelta(seconds=9999),
+                "jti": str(uuid.uuid4().hex),
+                "sub": str(uuid.uuid4().hex),
+                "typ": "ac",
+                "prm": ["query_articles"],
+            },
+            key=private_key, algorithm="EdDSA"
+        )
+        response = client.post("api/v1/articles/query", json={"select": ["_id"]}, headers={"Authorization": "Bearer " + token})
+        assert response.status_code == 200
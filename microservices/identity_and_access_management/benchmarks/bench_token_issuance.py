@@ -0,0 +1,79 @@
+"""
+Token issuance cost of /api/v1/tokens, pem bytes vs loaded signer
+run from service root: python benchmarks/bench_token_issuance.py --key=./encryption_private_key.pem
+"""
+import optparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.security.jwt_helpers import TokenSigner, generate_jwt_token  # noqa: E402
+from src.security.key_set import SigningKey  # noqa: E402
+
+
+def generate_jwt_token_from_pem(user_id, secret, access_token_ttl, refresh_token_ttl, algorithm, kid):
+    # previous implementation, pyjwt parses pem on every encode
+    jwt_payload = {
+        "iat": datetime.utcnow(),
+        "exp": datetime.utcnow() + timedelta(seconds=access_token_ttl),
+        "jti": str(uuid.uuid4().hex),
+        "sub": str(user_id),
+        "typ": "ac",
+        "pbm": "",
+        "prv": 0,
+    }
+    access_token = jwt.encode(payload=jwt_payload, key=secret, algorithm=algorithm, headers={"kid": kid})
+    jwt_payload.update({"typ": "rf", "exp": datetime.utcnow() + timedelta(seconds=refresh_token_ttl)})
+    refresh_token = jwt.encode(jwt_payload, key=secret, algorithm=algorithm, headers={"kid": kid})
+    return access_token, refresh_token
+
+
+def logins_per_second(issue, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        issue()
+    return iterations / (time.perf_counter() - started)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--key", default=None, help="private key pem, 4096 bit rsa generated if not given")
+    parser.add_option("--iterations", default=50, type="int", help="logins to simulate")
+    options, args = parser.parse_args()
+
+    if options.key:
+        with open(options.key, "rb") as f:
+            private_key = serialization.load_pem_private_key(f.read(), password=None)
+    else:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=4096)
+
+    signing_key = SigningKey(private_key)
+    pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    signer = TokenSigner(signing_key)
+
+    before = logins_per_second(
+        lambda: generate_jwt_token_from_pem("user", pem, 60, 120, signing_key.algorithm, signing_key.kid),
+        options.iterations
+    )
+    after = logins_per_second(lambda: generate_jwt_token("user", signer, 60, 120), options.iterations)
+
+    print("algorithm: {}".format(signing_key.algorithm))
+    print("pem bytes     : {:10.1f} logins/s".format(before))
+    print("loaded signer : {:10.1f} logins/s".format(after))
+    print("speedup       : {:10.2f}x".format(after / before))
+
+
+if __name__ == "__main__":
+    main()
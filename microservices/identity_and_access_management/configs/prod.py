@@ -5,8 +5,39 @@ prod_config = {
     "host": getenv("HOST"),
     "port": int(getenv("PORT", "8000")),
     "postgres_connection_string": getenv("POSTGRES_CONNECTION_STRING"),
+    "redis_connection_string": getenv("REDIS_CONNECTION_STRING"),
+    # connection pool of each worker, total connections
+    # are worker_count * (pg_pool_size + pg_max_overflow)
+    "pg_pool_size": int(getenv("PG_POOL_SIZE", "20")),
+    "pg_max_overflow": int(getenv("PG_MAX_OVERFLOW", "5")),
+    # in seconds, max wait for a free connection
+    "pg_pool_timeout": float(getenv("PG_POOL_TIMEOUT", "5")),
+    # in seconds, connections older than this are reopened
+    "pg_pool_recycle": int(getenv("PG_POOL_RECYCLE", "1800")),
+    "pg_pool_pre_ping": getenv("PG_POOL_PRE_PING", "true").lower() == "true",
+    # prepared statements kept per connection, 0 disables
+    "pg_prepared_statement_cache_size": int(getenv("PG_PREPARED_STATEMENT_CACHE_SIZE", "500")),
     "worker_count": int(getenv("WORKER_COUNT", "1")),
     "refresh_token_ttl": int(getenv("REFRESH_TOKEN_TTL", "432000")),
     "access_token_ttl": int(getenv("ACCESS_TOKEN_TTL", "86400")),
-    "encryption_file_path":getenv("ENCRYPTION_FILE_PATH")
+    # refresh endpoint also issues new refresh token and revokes used one
+    "refresh_token_rotation": getenv("REFRESH_TOKEN_ROTATION", "false").lower() == "true",
+    "encryption_file_path":getenv("ENCRYPTION_FILE_PATH"),
+    # comma separated, keys only published on jwks for verification while rotating
+    "additional_encryption_file_paths": [path for path in getenv("ADDITIONAL_ENCRYPTION_FILE_PATHS", "").split(",") if path],
+    # password hashing process pool and admission control
+    "password_hash_workers": int(getenv("PASSWORD_HASH_WORKERS", "2")),
+    "password_hash_max_queue": int(getenv("PASSWORD_HASH_MAX_QUEUE", "64")),
+    # in seconds, max wait for a free hashing worker
+    "password_hash_max_wait": float(getenv("PASSWORD_HASH_MAX_WAIT", "2")),
+    # cpu cost of every new hash, existing hashes upgraded on next login
+    # scheme: bcrypt, pbkdf2_sha256 ... rounds: cost parameter of that scheme,
+    # not set uses passlib's default of the scheme, values below a safe minimum rejected
+    "password_hash_scheme": getenv("PASSWORD_HASH_SCHEME", "bcrypt"),
+    "password_hash_rounds": int(getenv("PASSWORD_HASH_ROUNDS")) if getenv("PASSWORD_HASH_ROUNDS") else None,
+    # in seconds, role permission changes seen by token issue after at most this
+    "role_cache_ttl": int(getenv("ROLE_CACHE_TTL", "30")),
+    # /me profile cache, ttl in seconds
+    "profile_cache_max_size": int(getenv("PROFILE_CACHE_MAX_SIZE", "10000")),
+    "profile_cache_ttl": int(getenv("PROFILE_CACHE_TTL", "60")),
 }
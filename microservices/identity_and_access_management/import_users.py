@@ -0,0 +1,70 @@
+"""
+Bulk user import from ndjson or csv
+rows need full_name, email, password and optionally role_id
+failed rows are printed as ndjson to stdout, summary to stderr
+
+python import_users.py --config=prod --format=csv users.csv
+cat users.ndjson | python import_users.py --config=prod -
+"""
+import asyncio
+import io
+import json
+import optparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy.orm import sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from configs.local import local_config
+from configs.prod import prod_config
+from configs.stage import stage_config
+from src.repositories.postgres import create_pg_engine
+from src.services.user_import import DEFAULT_BATCH_SIZE, UserImporter, iter_rows
+
+
+CONFIG_LOOKUP = {
+    "local": local_config,
+    "prod": prod_config,
+    "stage": stage_config
+}
+
+
+def open_input(path):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def print_error(error):
+    print(json.dumps(error), flush=True)
+
+
+async def main(config, path, input_format, batch_size, workers):
+    pg_engine = create_pg_engine(config)
+    pg_session = sessionmaker(bind=pg_engine, class_=AsyncSession, expire_on_commit=False)
+    # offline job, may use every core unlike api's hashing pool
+    with ProcessPoolExecutor(max_workers=workers) as pool, open_input(path) as stream:
+        importer = UserImporter(
+            pg_session, pool, workers,
+            config["password_hash_scheme"], config["password_hash_rounds"],
+            batch_size=batch_size, on_error=print_error
+        )
+        summary = await importer.run(iter_rows(stream, input_format))
+    await pg_engine.dispose()
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser(usage="%prog [options] <path or - for stdin>")
+    parser.add_option("--config", default="local", help="which config to load")
+    parser.add_option("--format", default=None, help="ndjson or csv, guessed from file extension")
+    parser.add_option("--batch-size", type="int", default=DEFAULT_BATCH_SIZE, help="rows per insert")
+    parser.add_option("--workers", type="int", default=os.cpu_count(), help="hashing processes")
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error("input path required")
+
+    input_format = options.format or ("csv" if args[0].endswith(".csv") else "ndjson")
+    asyncio.run(main(CONFIG_LOOKUP[options.config], args[0], input_format, options.batch_size, options.workers))
@@ -1,52 +1,100 @@
 from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
-from cryptography.hazmat.primitives import serialization
 
 from fastapi import FastAPI
-from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import SQLModel
 
 from src.api.healthcheck import init_healthcheck_api
+from src.api.jwks import init_jwks_api
 from src.api.me import init_me_api
+from src.api.metrics import init_metrics_api
+from src.api.permissions import init_permissions_api
 from src.api.users import init_users_api
 from src.api.tokens import init_tokens_api
 from src.api.roles import init_roles_api
+from src.repositories.postgres import create_pg_engine
 from src.security.exceptions import init_exception_handler
+from src.security.jwt_helpers import TokenSigner
+from src.security.key_set import SigningKeySet
+from src.security.password_hasher import PasswordHasher
+from src.security.permission_registry import PermissionRegistry
+from src.security.profile_cache import UserProfileCache
+from src.security.revocation import TokenRevocationStore
+from src.security.role_cache import RolePermissionsCache
+
+
+def create_missing_indexes(connection):
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
 
 
 @asynccontextmanager
 async def lifespan(app):
 
-    # this will use to encrypt jwts
-    with open(app.config["encryption_file_path"], "rb") as f:
-        encryption_file = serialization.load_pem_private_key(f.read(), password=None)
-        app.encryption_public_key = encryption_file.public_key()
-        app.encryption_private_key = encryption_file.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption()  # or use BestAvailableEncryption(b"password")
-        )
-
-    # init postgres client
-    pg_engine = create_async_engine(app.config["postgres_connection_string"])
+    # this will use to sign jwts, additional keys are only
+    # published on jwks so tokens signed by them stay valid while rotating
+    app.signing_keys = SigningKeySet(
+        app.config["encryption_file_path"],
+        app.config["additional_encryption_file_paths"]
+    )
+    # active key loaded once, reused for every issued token
+    app.token_signer = TokenSigner(app.signing_keys.active)
+
+    # init postgres client, pool sized per config
+    pg_engine = create_pg_engine(app.config)
+    app.pg_pool = pg_engine.sync_engine.pool
     app.pg_session = sessionmaker(bind=pg_engine, class_=AsyncSession, expire_on_commit=False)
 
+    # revoked jtis, followed by other services through redis stream
+    app.revocation_store = TokenRevocationStore(
+        app.config["redis_connection_string"],
+        max(app.config["access_token_ttl"], app.config["refresh_token_ttl"])
+    )
+
+    # permission name to bit index mapping used in token claims
+    app.permission_registry = PermissionRegistry()
+
+    # role permissions read on every token issue, cached per worker
+    app.role_cache = RolePermissionsCache(app.config["role_cache_ttl"])
+    # /me profiles, polled by clients, cached per worker
+    app.profile_cache = UserProfileCache(app.config["profile_cache_max_size"], app.config["profile_cache_ttl"])
+
     # run migrations if option --migrate=true given
     if app.config.get("run_migrations"):
         from src.models.users import UserModel
         from src.models.roles import RoleModel
+        from src.models.permissions import PermissionModel
         async with pg_engine.begin() as connection:
             await connection.run_sync(SQLModel.metadata.create_all)
+            # create_all skips existing tables, add indexes defined later
+            await connection.run_sync(create_missing_indexes)
 
     # for cpu bound tasks to not block api
     # not forget the use it with asyncio.wrap_future
     # otherwise still blocks event loop
     app.thread_pool = ThreadPoolExecutor()
 
+    # password hashing is deliberately slow, own process pool
+    # with bounded queue keeps login bursts away from other requests
+    app.password_hasher = PasswordHasher(
+        app.config["password_hash_workers"],
+        app.config["password_hash_max_queue"],
+        app.config["password_hash_max_wait"],
+        app.config["password_hash_scheme"],
+        app.config["password_hash_rounds"]
+    )
+
     yield
 
+    app.password_hasher.shutdown()
+
+    await app.revocation_store.close()
+
+    await pg_engine.dispose()
+
 
 def create_fastapi_app(settings):
     app = FastAPI(lifespan=lifespan)
@@ -56,9 +104,12 @@ def create_fastapi_app(settings):
 
     # init apis
     init_healthcheck_api(app)
+    init_metrics_api(app)
     init_users_api(app)
     init_tokens_api(app)
     init_roles_api(app)
     init_me_api(app)
+    init_jwks_api(app)
+    init_permissions_api(app)
 
     return app
\ No newline at end of file
@@ -0,0 +1,9 @@
+from fastapi import Request
+
+
+def init_jwks_api(app):
+    @app.get("/api/v1/jwks", status_code=200)
+    async def get_jwks(request: Request):
+        # public keys other microservices verify jwts with
+        # selected by kid header of the token
+        return request.app.signing_keys.jwks()
@@ -1,9 +1,9 @@
-import jwt
 from fastapi import Request
 from sqlmodel import select
 
 from src.models.users import UserModel
 from src.security.exceptions import AppException
+from src.security.jwt_helpers import verify_jwt_token
 
 
 def init_me_api(app):
@@ -17,23 +17,34 @@ def init_me_api(app):
             )
         auth_token = request.headers["authorization"].split("Bearer ")[1]
 
-        decoded_unverified = jwt.decode(auth_token, algorithms="RS256", options={"verify_signature": False})
-        if decoded_unverified.get("typ") != "ac":
+        # forged or expired tokens rejected before touching postgres
+        verified_decoded = verify_jwt_token(auth_token, request.app.signing_keys)
+        if verified_decoded.get("typ") != "ac":
             raise AppException(
                 error_message="invalid token type",
                 error_code="exceptions.invalidTokenType",
                 status_code=401
             )
-        async with request.app.pg_session() as session:
-            user = (await session.exec(select(UserModel).where(UserModel.id == decoded_unverified["sub"]))).first()
-            if not user:
-                raise AppException(
-                    error_message="User not found",
-                    error_code="exceptions.userNotFound",
-                    status_code=404
-                )
-        verified_decoded = jwt.decode(auth_token, key=request.app.encryption_public_key, algorithms="RS256", options={"verify_signature": True, "verify_exp": True})
-        del user.password
+        if await request.app.revocation_store.is_revoked(verified_decoded["jti"]):
+            raise AppException(
+                error_message="token revoked",
+                error_code="exceptions.tokenRevoked",
+                status_code=401
+            )
+
+        user_id = verified_decoded["sub"]
+        profile = request.app.profile_cache.get(user_id)
+        if profile is None:
+            async with request.app.pg_session() as session:
+                user = (await session.exec(select(UserModel).where(UserModel.id == user_id))).first()
+                if not user:
+                    raise AppException(
+                        error_message="User not found",
+                        error_code="exceptions.userNotFound",
+                        status_code=404
+                    )
+            # not return hashed password to client
+            profile = user.model_dump(exclude={"password"})
+            request.app.profile_cache.set(user_id, profile)
 
-        return user
-        
\ No newline at end of file
+        return profile
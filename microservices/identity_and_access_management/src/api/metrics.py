@@ -0,0 +1,14 @@
+from fastapi import Request
+
+
+def init_metrics_api(app):
+    @app.get("/api/v1/metrics")
+    async def metrics(request: Request):
+        # in-process counters of this worker, no keys or ids since
+        # the endpoint is unauthenticated
+        return {
+            "password_hasher": request.app.password_hasher.stats(),
+            "pg_pool": request.app.pg_pool.stats(),
+            "role_cache": request.app.role_cache.stats(),
+            "profile_cache": request.app.profile_cache.stats(),
+        }
@@ -0,0 +1,12 @@
+from fastapi import Request
+
+
+def init_permissions_api(app):
+    @app.get("/api/v1/permissions", status_code=200)
+    async def get_permission_registry(request: Request):
+        # other microservices decode bitmap permission claims with this
+        # always read from db so workers never publish an older version
+        async with request.app.pg_session() as session:
+            await request.app.permission_registry.load(session)
+
+        return request.app.permission_registry.snapshot()
@@ -7,8 +7,12 @@ def init_roles_api(app):
     @app.post("/api/v1/roles", status_code=201)
     async def create_role(role: RoleModel, request: Request):
         async with request.app.pg_session() as session:
-            # safe store password
+            # every permission needs a bit before tokens can carry it
+            await request.app.permission_registry.register(session, role.permissions or [])
             session.add(role)
             await session.commit()
+        request.app.role_cache.invalidate(role.name)
+        # profiles embed role_id only, but keep them consistent with role data
+        request.app.profile_cache.clear()
 
         return role
\ No newline at end of file
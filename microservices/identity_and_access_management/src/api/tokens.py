@@ -1,43 +1,145 @@
 import asyncio
-from fastapi import Request
-from sqlmodel import select
-from passlib.hash import bcrypt
+import logging
+import uuid
+from fastapi import BackgroundTasks, Request
+from sqlmodel import select, update
 
-from src.models.tokens import TokenCreateModel
+from src.models.tokens import TokenCreateModel, TokenRefreshModel, TokenRevokeModel
 from src.models.users import UserModel
-from src.models.roles import RoleModel
 from src.security.exceptions import AppException
-from src.security.jwt_helpers import generate_jwt_token
+from src.security.jwt_helpers import generate_jwt_token, verify_jwt_token
+
+
+logger = logging.getLogger(__name__)
+
+
+async def upgrade_password_hash(app, user_id, old_hashed_password, password):
+    """Re-hash password with current cost, runs after login response is sent"""
+    try:
+        new_hashed_password = await app.password_hasher.hash(password)
+    except AppException:
+        # hashing busy, next login will try again
+        return
+
+    async with app.pg_session() as session:
+        # only replace hash we verified, password may changed meanwhile
+        await session.execute(
+            update(UserModel)
+            .where(UserModel.id == user_id, UserModel.password == old_hashed_password)
+            .values(password=new_hashed_password)
+        )
+        await session.commit()
+    # updated_at changed
+    app.profile_cache.invalidate(user_id.hex)
+    logger.info("password hash upgraded for user {}".format(user_id))
 
 
 def init_tokens_api(app):
     @app.post("/api/v1/tokens", status_code=201)
-    async def create_token(credentials: TokenCreateModel, request: Request):
+    async def create_token(credentials: TokenCreateModel, request: Request, background_tasks: BackgroundTasks):
         async with request.app.pg_session() as session:
-            user, role = (await session.exec(select(UserModel, RoleModel).where(UserModel.email == credentials.email))).first()
+            # email is unique indexed, role permissions come from role cache
+            user = (await session.exec(select(UserModel).where(UserModel.email == credentials.email))).first()
             if not user:
                 raise AppException(
                     error_message="Email or password missmatch",
                     error_code="exceptions.emailOrPasswordMissmatch",
                     status_code=403
                 )
-        verified = await asyncio.wrap_future(
-            request.app.thread_pool.submit(bcrypt.verify, credentials.password, user.password)
-        )
+        verified = await request.app.password_hasher.verify(credentials.password, user.password)
         if not verified:
             raise AppException(
                 error_message="Email or password missmatch",
                 error_code="exceptions.emailOrPasswordMissmatch",
                 status_code=403
             )
-        permissions = getattr(role, "permissions", None) if role else None
+        if request.app.password_hasher.needs_update(user.password):
+            # hashed with an old scheme or cost, upgrade off the request path
+            background_tasks.add_task(
+                upgrade_password_hash, request.app, user.id, user.password, credentials.password
+            )
+        async with request.app.pg_session() as session:
+            permissions = await request.app.role_cache.get(session, user.role_id)
+            permission_bitmap, registry_version = await request.app.permission_registry.encode(session, permissions)
+        # both tokens signed in one thread pool task
         ac_token, rf_token = await asyncio.wrap_future(
             request.app.thread_pool.submit(
-                generate_jwt_token, str(user.id.hex), app.encryption_private_key,
+                generate_jwt_token, str(user.id.hex), request.app.token_signer,
                 request.app.config["access_token_ttl"],
                 request.app.config["refresh_token_ttl"],
-                permissions=permissions
+                permission_bitmap=permission_bitmap,
+                registry_version=registry_version
             )
         )
 
         return {"user_id": user.id, "access_token": ac_token, "refresh_token": rf_token}
+
+    @app.post("/api/v1/tokens/refresh", status_code=201)
+    async def refresh_token(payload: TokenRefreshModel, request: Request):
+        # no password verify, renewing a session costs one signature
+        verified_decoded = verify_jwt_token(payload.refresh_token, request.app.signing_keys)
+        if verified_decoded.get("typ") != "rf":
+            raise AppException(
+                error_message="invalid token type",
+                error_code="exceptions.invalidTokenType",
+                status_code=401
+            )
+        # also rejects rotated refresh tokens used a second time
+        if await request.app.revocation_store.is_revoked(verified_decoded["jti"]):
+            raise AppException(
+                error_message="token revoked",
+                error_code="exceptions.tokenRevoked",
+                status_code=401
+            )
+
+        # permissions reloaded so role changes apply on next refresh
+        user_id = verified_decoded["sub"]
+        profile = request.app.profile_cache.get(user_id)
+        async with request.app.pg_session() as session:
+            if profile is not None:
+                role_id = profile["role_id"]
+            else:
+                role_ids = (await session.exec(
+                    select(UserModel.role_id).where(UserModel.id == uuid.UUID(user_id))
+                )).all()
+                if not role_ids:
+                    raise AppException(
+                        error_message="User not found",
+                        error_code="exceptions.userNotFound",
+                        status_code=404
+                    )
+                role_id = role_ids[0]
+            permissions = await request.app.role_cache.get(session, role_id)
+            permission_bitmap, registry_version = await request.app.permission_registry.encode(session, permissions)
+
+        rotate = request.app.config["refresh_token_rotation"]
+        # old refresh token is single use, claimed before issuing so
+        # concurrent refreshes with the same token get one new pair
+        if rotate and not await request.app.revocation_store.claim(verified_decoded["jti"], verified_decoded["exp"]):
+            raise AppException(
+                error_message="token revoked",
+                error_code="exceptions.tokenRevoked",
+                status_code=401
+            )
+        ac_token, rf_token = await asyncio.wrap_future(
+            request.app.thread_pool.submit(
+                generate_jwt_token, user_id, request.app.token_signer,
+                request.app.config["access_token_ttl"],
+                request.app.config["refresh_token_ttl"] if rotate else None,
+                permission_bitmap=permission_bitmap,
+                registry_version=registry_version
+            )
+        )
+        if rotate:
+            return {"user_id": user_id, "access_token": ac_token, "refresh_token": rf_token}
+
+        return {"user_id": user_id, "access_token": ac_token}
+
+    @app.post("/api/v1/tokens/revoke", status_code=204)
+    async def revoke_token(payload: TokenRevokeModel, request: Request):
+        # only tokens signed by us can be revoked
+        # jti is rejected by every service until the token expires
+        verified_decoded = verify_jwt_token(payload.token, request.app.signing_keys)
+        await request.app.revocation_store.revoke(verified_decoded["jti"], verified_decoded["exp"])
+
+        return {}
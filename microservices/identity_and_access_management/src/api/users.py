@@ -1,21 +1,57 @@
-import asyncio
+import base64
+import json
+import uuid
+from datetime import datetime
 
-from fastapi import Request
-from passlib import hash
+from fastapi import Depends, Request
+from sqlalchemy import tuple_
 from sqlmodel import select
 
 from src.models.roles import RoleModel
 from src.models.users import UserModel
+from src.security.auth import authenticate_and_authorize
 from src.security.exceptions import AppException
 
+# every column except password, which is never selected
+USER_FIELDS = ("id", "full_name", "email", "role_id", "created_at", "updated_at")
+MAX_PAGE_SIZE = 500
+
+
+def parse_fields(fields):
+    if not fields:
+        return USER_FIELDS
+    requested = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in requested if field not in USER_FIELDS]
+    if unknown:
+        raise AppException(
+            error_message="unknown fields: {}".format(", ".join(unknown)),
+            error_code="exceptions.unknownFields",
+            status_code=400
+        )
+    return requested
+
+
+def encode_cursor(created_at, user_id):
+    raw = json.dumps([created_at.isoformat(), user_id.hex]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, user_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), uuid.UUID(user_id)
+    except (ValueError, TypeError):
+        raise AppException(
+            error_message="invalid cursor",
+            error_code="exceptions.invalidCursor",
+            status_code=400
+        )
+
 
 def init_users_api(app):
     @app.post("/api/v1/users", status_code=201)
     async def create_user(user: UserModel, request: Request):
-        hashed_password = await asyncio.wrap_future(
-            request.app.thread_pool.submit(hash.bcrypt.hash, user.password)
-        )
-        user.password = hashed_password
+        user.password = await request.app.password_hasher.hash(user.password)
         async with request.app.pg_session() as session:
             role = (await session.exec(select(RoleModel).where(RoleModel.name == user.role_id))).first()
             if not role:
@@ -26,17 +62,59 @@ def init_users_api(app):
                 )
             session.add(user)
             await session.commit()
+        request.app.profile_cache.invalidate(user.id.hex)
 
         # not return hashed password to client
         del user.password
 
         return user
 
+    @app.get("/api/v1/users", status_code=200)
+    async def list_users(
+            request: Request, cursor: str | None = None, limit: int = 50, fields: str | None = None,
+            current_user = Depends(authenticate_and_authorize)
+    ):
+        fields = parse_fields(fields)
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+        # keyset columns always selected to build next cursor
+        columns = [getattr(UserModel, field) for field in dict.fromkeys(fields + ("created_at", "id"))]
+
+        # seek on (created_at, id) index, cost does not grow with page depth
+        statement = select(*columns).order_by(UserModel.created_at, UserModel.id).limit(limit + 1)
+        if cursor:
+            statement = statement.where(tuple_(UserModel.created_at, UserModel.id) > tuple_(*decode_cursor(cursor)))
+        async with request.app.pg_session() as session:
+            rows = (await session.execute(statement)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+        return {
+            "users": [{field: getattr(row, field) for field in fields} for row in rows],
+            "next_cursor": next_cursor
+        }
+
+    @app.get("/api/v1/users/{user_id}", status_code=200)
+    async def get_user(
+            user_id: uuid.UUID, request: Request, fields: str | None = None,
+            current_user = Depends(authenticate_and_authorize)
+    ):
+        fields = parse_fields(fields)
+        statement = select(*[getattr(UserModel, field) for field in fields]).where(UserModel.id == user_id)
+        async with request.app.pg_session() as session:
+            row = (await session.execute(statement)).first()
+        if not row:
+            raise AppException(
+                error_message="User not found",
+                error_code="exceptions.userNotFound",
+                status_code=404
+            )
+
+        return dict(row._mapping)
+
     # TODO add this endpoints
-    # @app.get("/api/v1/users/{user_id}")
-    # async def get_user(user_id: str, request: Request):
-    #     return {"status": "ok"}
-    #
     # @app.put("/api/v1/users/{user_id}")
     # async def update_user(user_id: str, request: Request):
     #     return {"status": "ok"}
@@ -0,0 +1,12 @@
+from sqlmodel import Field, SQLModel
+
+from src.models import SysModel
+
+
+class PermissionModel(SQLModel, SysModel, table=True):
+    __tablename__ = "permissions"
+
+    # append only registry, a permission never changes its bit
+    # so tokens issued with an older registry version stay decodable
+    name: str = Field(nullable=False, primary_key=True)
+    bit_index: int = Field(nullable=False, unique=True)
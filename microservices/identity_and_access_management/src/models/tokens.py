@@ -4,3 +4,12 @@ from sqlmodel import Field, SQLModel, Column, VARCHAR
 class TokenCreateModel(SQLModel):
     email: str = Field(sa_column=Column("email", VARCHAR))
     password: str = Field(sa_column=Column("password", VARCHAR))
+
+
+class TokenRevokeModel(SQLModel):
+    # access or refresh token to revoke
+    token: str
+
+
+class TokenRefreshModel(SQLModel):
+    refresh_token: str
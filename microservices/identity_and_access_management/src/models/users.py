@@ -1,3 +1,4 @@
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, Column, VARCHAR
 from pydantic import EmailStr
 
@@ -6,8 +7,18 @@ from src.models import PkModel, SysModel
 
 class UserModel(SQLModel, PkModel, SysModel, table=True):
     __tablename__ = "users"
+    # keyset pagination of user listing
+    __table_args__ = (Index("ix_users_created_at_id", "created_at", "id"),)
 
     full_name: str = Field(nullable=False)
     email: EmailStr = Field(sa_column=Column("email", VARCHAR, unique=True))
     password: str = Field(sa_column=Column("password", VARCHAR))
     role_id: str | None = Field(foreign_key="roles.name", ondelete="SET NULL")
+
+
+class UserImportModel(SQLModel):
+    # one row of bulk import input, password still plain text
+    full_name: str
+    email: EmailStr
+    password: str
+    role_id: str | None = None
@@ -0,0 +1,58 @@
+import time
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long callers waited for a connection,
+    includes connect time when pool opens a new connection
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started_at
+            self.checkouts += 1
+            self.checkout_wait_total += waited
+            self.checkout_wait_max = max(self.checkout_wait_max, waited)
+
+    def stats(self):
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": self.overflow(),
+            "checkouts": self.checkouts,
+            "checkout_wait_avg_ms": round(self.checkout_wait_total / self.checkouts * 1000, 3) if self.checkouts else 0,
+            "checkout_wait_max_ms": round(self.checkout_wait_max * 1000, 3),
+        }
+
+
+def create_pg_engine(config):
+    return create_async_engine(
+        config["postgres_connection_string"],
+        poolclass=TimedQueuePool,
+        pool_size=config["pg_pool_size"],
+        max_overflow=config["pg_max_overflow"],
+        pool_timeout=config["pg_pool_timeout"],
+        pool_recycle=config["pg_pool_recycle"],
+        pool_pre_ping=config["pg_pool_pre_ping"],
+        connect_args={
+            # statements are prepared per connection and reused by sql text,
+            # a select() built per call renders the same text every time
+            # sqlalchemy asyncpg dialect's prepared statement cache
+            "prepared_statement_cache_size": config["pg_prepared_statement_cache_size"],
+            # asyncpg's own statement cache, used by its non-prepared calls
+            "statement_cache_size": config["pg_prepared_statement_cache_size"],
+        },
+    )
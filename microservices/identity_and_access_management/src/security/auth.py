@@ -0,0 +1,46 @@
+from fastapi import Request
+
+from src.security.exceptions import AppException
+from src.security.jwt_helpers import verify_jwt_token
+from src.security.permissions import CompiledPermissions
+
+
+async def authenticate_and_authorize(rq: Request):
+    # action like list_users
+    # required permission to access this endpoint
+    required_permission = rq.scope["route"].name
+
+    if not rq.headers.get("authorization", "").startswith("Bearer "):
+        raise AppException(
+            error_message="invalid authorization header",
+            error_code="exceptions.invalidAuthorizationHeader",
+            status_code=401
+        )
+
+    token = rq.headers.get("authorization").split("Bearer ")[1]
+    verified_decoded = verify_jwt_token(token, rq.app.signing_keys)
+    if verified_decoded.get("typ") != "ac":
+        raise AppException(
+            error_message="invalid token type",
+            error_code="exceptions.invalidTokenType",
+            status_code=401
+        )
+    if await rq.app.revocation_store.is_revoked(verified_decoded["jti"]):
+        raise AppException(
+            error_message="token revoked",
+            error_code="exceptions.tokenRevoked",
+            status_code=401
+        )
+
+    async with rq.app.pg_session() as session:
+        permission_names = await rq.app.permission_registry.decode(
+            session, verified_decoded.get("pbm", ""), verified_decoded.get("prv", 0)
+        )
+    if not CompiledPermissions(permission_names).allows(required_permission):
+        raise AppException(
+            error_message="User has no permission take this action",
+            error_code="exceptions.userNotAuthorized",
+            status_code=403
+        )
+
+    return verified_decoded
@@ -1,13 +1,24 @@
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import rsa, ec, ed25519
 from cryptography.hazmat.primitives import serialization
 
 
+def _generate_private_key(algorithm):
+    # EdDSA and ES256 keys are much cheaper to sign/verify
+    # than 4096 bit rsa, RS256 kept for backward compatibility
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    if algorithm == "ES256":
+        return ec.generate_private_key(ec.SECP256R1())
+    if algorithm == "RS256":
+        return rsa.generate_private_key(
+            public_exponent=65537,
+            key_size=4096
+        )
+    raise ValueError("unsupported algorithm {}".format(algorithm))
 
-def generate_keys():
-    private_key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=4096
-    )
+
+def generate_keys(algorithm="RS256"):
+    private_key = _generate_private_key(algorithm)
     pem_private = private_key.private_bytes(
         encoding=serialization.Encoding.PEM,
         format=serialization.PrivateFormat.PKCS8,
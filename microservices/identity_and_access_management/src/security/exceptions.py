@@ -3,10 +3,11 @@ from sqlalchemy.exc import IntegrityError
 from jwt.exceptions import PyJWTError
 
 class AppException(Exception):
-    def __init__(self, error_message, error_code, status_code):
+    def __init__(self, error_message, error_code, status_code, headers=None):
         self.error_message = error_message
         self.error_code = error_code
         self.status_code = status_code
+        self.headers = headers
 
 def init_exception_handler(app):
     @app.exception_handler(Exception)
@@ -14,7 +15,8 @@ def init_exception_handler(app):
         if isinstance(exc, AppException):
             return JSONResponse(
                 status_code=exc.status_code,
-                content={"error_msg": exc.error_message, "error_code": exc.error_code}
+                content={"error_msg": exc.error_message, "error_code": exc.error_code},
+                headers=exc.headers
             )
         elif isinstance(exc, PyJWTError):
             return JSONResponse(
@@ -3,7 +3,25 @@ import uuid
 from datetime import datetime, timedelta
 
 
-def generate_jwt_token(user_id, secret, access_token_ttl, refresh_token_ttl, permissions=None):
+class TokenSigner:
+    """
+    Signs jwts with an already loaded private key object
+    built once on startup, passing pem bytes instead makes
+    pyjwt parse the key again for every token
+    """
+
+    def __init__(self, signing_key):
+        self.kid = signing_key.kid
+        self.algorithm = signing_key.algorithm
+        self._private_key = signing_key.private_key
+        # kid lets verifiers pick the right key from jwks while keys rotate
+        self._headers = {"kid": signing_key.kid}
+
+    def sign(self, payload):
+        return jwt.encode(payload=payload, key=self._private_key, algorithm=self.algorithm, headers=self._headers)
+
+
+def generate_jwt_token(user_id, signer, access_token_ttl, refresh_token_ttl, permission_bitmap="", registry_version=0):
     jwt_payload = {
         "iat": datetime.utcnow(),
         "exp": datetime.utcnow() + timedelta(seconds=access_token_ttl),
@@ -13,14 +31,33 @@ def generate_jwt_token(user_id, secret, access_token_ttl, refresh_token_ttl, per
         "sub": str(user_id),
         # type --> access token
         "typ": "ac",
-        "prm": permissions if permissions else [],
+        # permissions as base64 bitmap of permission registry bits
+        # decoded by services with registry of at least this version
+        "pbm": permission_bitmap,
+        "prv": registry_version,
     }
     # generate access token
-    access_token = jwt.encode(payload=jwt_payload, key=secret, algorithm='RS256')
+    access_token = signer.sign(jwt_payload)
+    if refresh_token_ttl is None:
+        # refresh without rotation, client keeps its refresh token
+        return access_token, None
 
-    # update expire and type to refresh token
-    jwt_payload.update({"typ": "rf", "exp": datetime.utcnow() + timedelta(seconds=refresh_token_ttl)})
+    # update expire and type to refresh token, own jti so revoking
+    # or rotating one token never revokes the other
+    jwt_payload.update({
+        "typ": "rf", "exp": datetime.utcnow() + timedelta(seconds=refresh_token_ttl), "jti": str(uuid.uuid4().hex)
+    })
     # generate refresh token
-    refresh_token = jwt.encode(jwt_payload, key=secret, algorithm='RS256')
+    refresh_token = signer.sign(jwt_payload)
 
     return access_token, refresh_token
+
+
+def verify_jwt_token(token, key_set):
+    # algorithm comes from our own key not from token header
+    # to not accept algorithm confusion attacks
+    signing_key = key_set.get(jwt.get_unverified_header(token).get("kid"))
+    return jwt.decode(
+        token, key=signing_key.public_key, algorithms=[signing_key.algorithm],
+        options={"verify_signature": True, "verify_exp": True}
+    )
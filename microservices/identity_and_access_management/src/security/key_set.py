@@ -0,0 +1,78 @@
+import base64
+import hashlib
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa, ec, ed25519
+from jwt.algorithms import get_default_algorithms
+
+from src.security.exceptions import AppException
+
+
+def _algorithm_for(private_key):
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        return "EdDSA"
+    if isinstance(private_key, ec.EllipticCurvePrivateKey) and isinstance(private_key.curve, ec.SECP256R1):
+        return "ES256"
+    if isinstance(private_key, rsa.RSAPrivateKey):
+        return "RS256"
+    raise ValueError("unsupported key type {}".format(type(private_key).__name__))
+
+
+def _key_id(public_key):
+    # derived from public key so every worker and every
+    # restart produces the same kid for the same key file
+    der = public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return base64.urlsafe_b64encode(hashlib.sha256(der).digest()[:12]).decode().rstrip("=")
+
+
+class SigningKey:
+    def __init__(self, private_key):
+        self.algorithm = _algorithm_for(private_key)
+        self.public_key = private_key.public_key()
+        self.kid = _key_id(self.public_key)
+        # loaded key object, pem bytes would be parsed again on every sign
+        self.private_key = private_key
+
+    def jwk(self):
+        jwk = get_default_algorithms()[self.algorithm].to_jwk(self.public_key, as_dict=True)
+        jwk.update({"kid": self.kid, "alg": self.algorithm, "use": "sig"})
+        return jwk
+
+
+class SigningKeySet:
+    """
+    Keys IAM signs and verifies jwts with
+    - active key signs every new token
+    - other keys are only published/verified, used while rotating keys
+    """
+
+    def __init__(self, active_key_path, additional_key_paths=None):
+        self.active = self._load(active_key_path)
+        self._keys = {self.active.kid: self.active}
+        for path in additional_key_paths or []:
+            key = self._load(path)
+            self._keys[key.kid] = key
+
+    @staticmethod
+    def _load(path):
+        with open(path, "rb") as f:
+            return SigningKey(serialization.load_pem_private_key(f.read(), password=None))
+
+    def get(self, kid):
+        # tokens issued before kid header existed are signed by active key
+        if kid is None:
+            return self.active
+        key = self._keys.get(kid)
+        if not key:
+            raise AppException(
+                error_message="unknown signing key",
+                error_code="exceptions.unknownSigningKey",
+                status_code=401
+            )
+        return key
+
+    def jwks(self):
+        return {"keys": [key.jwk() for key in self._keys.values()]}
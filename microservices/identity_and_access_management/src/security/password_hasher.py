@@ -0,0 +1,202 @@
+import asyncio
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from passlib.context import CryptContext
+
+from src.security.exceptions import AppException
+
+
+# lowest accepted cost per scheme, a typo or a value meant for another
+# scheme (e.g. 12 with pbkdf2) must not weaken every upgraded hash
+MIN_ROUNDS = {
+    "bcrypt": 10,
+    "pbkdf2_sha256": 29000,
+    "pbkdf2_sha512": 25000,
+    "sha256_crypt": 535000,
+    "sha512_crypt": 656000,
+    "argon2": 2,
+    "scrypt": 16,
+}
+
+
+@lru_cache(maxsize=None)
+def build_crypt_context(scheme, rounds=None):
+    """
+    Hashes with given scheme and cost, older schemes and lower costs still
+    verify but are reported by needs_update so they can be upgraded
+    - rounds None keeps passlib's default cost of the scheme
+    """
+    if scheme not in MIN_ROUNDS:
+        raise ValueError("unsupported password hash scheme {}".format(scheme))
+    if rounds is not None and rounds < MIN_ROUNDS[scheme]:
+        raise ValueError("{} rounds must be at least {}".format(scheme, MIN_ROUNDS[scheme]))
+    # bcrypt always kept since every existing password is bcrypt
+    schemes = list(dict.fromkeys([scheme, "bcrypt"]))
+    rounds_settings = {}
+    if rounds is not None:
+        rounds_settings[f"{scheme}__default_rounds"] = rounds
+    context = CryptContext(
+        schemes=schemes,
+        default=scheme,
+        deprecated=[name for name in schemes if name != scheme],
+        **rounds_settings
+    )
+    # only weaker hashes need update, stronger ones are never rehashed down
+    target_rounds = context.handler(scheme).default_rounds if rounds is None else rounds
+    context.update(**{f"{scheme}__min_rounds": target_rounds})
+    return context
+
+
+# run inside pool processes, context built once per process
+def _hash_password(password, scheme, rounds):
+    return build_crypt_context(scheme, rounds).hash(password)
+
+
+def _hash_passwords(passwords, scheme, rounds):
+    # many hashes per task, used by bulk import to cut ipc round trips
+    context = build_crypt_context(scheme, rounds)
+    return [context.hash(password) for password in passwords]
+
+
+def _verify_password(password, hashed_password, scheme, rounds):
+    return build_crypt_context(scheme, rounds).verify(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs deliberately slow password hashing on a dedicated process pool
+    so login bursts can not starve the rest of the api
+    - at most `workers` hashes run at the same time
+    - at most `max_queue` requests wait or run, more rejected with 429
+    - requests waiting longer than `max_wait` seconds rejected with 503
+    - broken (crashed worker) or shut down pool rejected with 503, a
+      broken pool is replaced for the next requests
+    - rejections carry Retry-After
+    - scheme and rounds set the cpu cost of every new hash
+    """
+
+    def __init__(self, workers, max_queue, max_wait, scheme="bcrypt", rounds=None):
+        self.scheme = scheme
+        self.rounds = rounds
+        self._context = build_crypt_context(scheme, rounds)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._pool = ProcessPoolExecutor(max_workers=workers)
+        self._slots = asyncio.Semaphore(workers)
+        self._pending = 0
+        self._running = 0
+        self._closed = False
+
+        self.completed = 0
+        self.failed = 0
+        self.rejected_queue_full = 0
+        self.rejected_wait_timeout = 0
+        self.rejected_unavailable = 0
+        self.wait_seconds_total = 0.0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AppException(
+                error_message="too many password requests, try again later",
+                error_code="exceptions.passwordQueueFull",
+                status_code=429,
+                headers=self._retry_after()
+            )
+
+        self._pending += 1
+        try:
+            queued_at = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                self.rejected_wait_timeout += 1
+                raise AppException(
+                    error_message="password service busy, try again later",
+                    error_code="exceptions.passwordQueueTimeout",
+                    status_code=503,
+                    headers=self._retry_after()
+                )
+
+            self._running += 1
+            started_at = time.perf_counter()
+            self.wait_seconds_total += started_at - queued_at
+            succeeded = False
+            try:
+                pool = self._pool
+                try:
+                    future = pool.submit(fn, *args)
+                    result = await asyncio.wrap_future(future)
+                    succeeded = True
+                    return result
+                except BrokenProcessPool:
+                    # a worker died, its pool never accepts work again
+                    if not self._closed and self._pool is pool:
+                        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                    raise self._unavailable()
+                except RuntimeError:
+                    # submit after shutdown
+                    raise self._unavailable()
+            finally:
+                elapsed = time.perf_counter() - started_at
+                if succeeded:
+                    self.completed += 1
+                    self.hash_seconds_total += elapsed
+                    self.hash_seconds_max = max(self.hash_seconds_max, elapsed)
+                else:
+                    # pool unavailable, error in worker or caller cancelled,
+                    # kept out of completed and hash latency
+                    self.failed += 1
+                self._running -= 1
+                self._slots.release()
+        finally:
+            self._pending -= 1
+
+    def _retry_after(self):
+        return {"Retry-After": str(max(math.ceil(self.max_wait), 1))}
+
+    def _unavailable(self):
+        self.rejected_unavailable += 1
+        return AppException(
+            error_message="password service unavailable, try again later",
+            error_code="exceptions.passwordServiceUnavailable",
+            status_code=503,
+            headers=self._retry_after()
+        )
+
+    async def hash(self, password):
+        return await self._run(_hash_password, password, self.scheme, self.rounds)
+
+    async def verify(self, password, hashed_password):
+        return await self._run(_verify_password, password, hashed_password, self.scheme, self.rounds)
+
+    def needs_update(self, hashed_password):
+        # only parses the hash, cheap enough for event loop
+        return self._context.needs_update(hashed_password)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "queue_depth": self._pending - self._running,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_wait_timeout": self.rejected_wait_timeout,
+            "rejected_unavailable": self.rejected_unavailable,
+            "avg_wait_seconds": self.wait_seconds_total / self.completed if self.completed else 0.0,
+            "avg_hash_seconds": self.hash_seconds_total / self.completed if self.completed else 0.0,
+            "max_hash_seconds": self.hash_seconds_max,
+        }
+
+    def shutdown(self):
+        self._closed = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,80 @@
+import base64
+
+from sqlalchemy.sql import text
+from sqlmodel import select
+
+from src.models.permissions import PermissionModel
+
+
+def encode_permission_bitmap(bit_indexes):
+    bitmap = 0
+    for bit_index in bit_indexes:
+        bitmap |= 1 << bit_index
+    raw = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_permission_bitmap(bitmap):
+    raw = base64.urlsafe_b64decode(bitmap + "=" * (-len(bitmap) % 4))
+    value = int.from_bytes(raw, "little")
+    return [bit_index for bit_index in range(value.bit_length()) if value >> bit_index & 1]
+
+
+class PermissionRegistry:
+    """
+    Maps every permission name to a bit index so tokens can carry
+    a compact base64 bitmap instead of the full permission list
+    - version is the number of registered permissions
+    - registry is append only, any registry with version >= token's
+      version decodes the token correctly
+    """
+
+    def __init__(self):
+        self._names = []
+        self._bit_indexes = {}
+
+    @property
+    def version(self):
+        return len(self._names)
+
+    def _set(self, rows):
+        self._names = [row.name for row in rows]
+        self._bit_indexes = {row.name: row.bit_index for row in rows}
+
+    async def load(self, session):
+        rows = (await session.exec(select(PermissionModel).order_by(PermissionModel.bit_index))).all()
+        self._set(rows)
+
+    async def register(self, session, names):
+        """Add unknown permission names with next free bits, commits the session"""
+        # other workers may register at the same time
+        # lock keeps bit indexes gapless and unique
+        await session.execute(text("LOCK TABLE permissions IN SHARE ROW EXCLUSIVE MODE"))
+        await self.load(session)
+
+        missing = [name for name in dict.fromkeys(names) if name not in self._bit_indexes]
+        for offset, name in enumerate(missing):
+            session.add(PermissionModel(name=name, bit_index=self.version + offset))
+        await session.commit()
+
+        if missing:
+            await self.load(session)
+
+    async def encode(self, session, names):
+        names = names or []
+        if any(name not in self._bit_indexes for name in names):
+            # registered by another worker or role created before registry existed
+            await self.register(session, names)
+        bitmap = encode_permission_bitmap(self._bit_indexes[name] for name in names)
+        return bitmap, self.version
+
+    async def decode(self, session, bitmap, version):
+        if version > self.version:
+            # registered by another worker after our last load
+            await self.load(session)
+        return tuple(
+            self._names[bit_index] for bit_index in decode_permission_bitmap(bitmap) if bit_index < self.version
+        )
+
+    def snapshot(self):
+        return {"version": self.version, "permissions": list(self._names)}
@@ -0,0 +1,77 @@
+import re
+from typing import Dict, Iterable
+
+WILDCARD = "*"
+# marks end of a wildcard pattern inside trie
+_TERMINAL = ""
+
+
+def _insert(trie: Dict, chars: str) -> None:
+    node = trie
+    for char in chars:
+        node = node.setdefault(char, {})
+    node[_TERMINAL] = True
+
+
+def _has_pattern_for(trie: Dict, chars: Iterable[str]) -> bool:
+    """True if any pattern stored in trie is a prefix of chars"""
+    node = trie
+    if _TERMINAL in node:
+        return True
+    for char in chars:
+        node = node.get(char)
+        if node is None:
+            return False
+        if _TERMINAL in node:
+            return True
+    return False
+
+
+class CompiledPermissions:
+    """
+    Permission list of a token compiled once for fast route checks
+    - exact grants are kept in a frozenset
+    - "article:*" like grants are kept in a prefix trie
+    - "*_article" like grants are kept in a suffix trie (reversed prefix)
+    - any other grant with wildcards, e.g. "articles_*_own" or "*get*",
+      is matched by one regex
+    - "*" grants everything
+    Every decision is memoized so repeated checks of a route are O(1)
+    """
+
+    def __init__(self, permissions: Iterable[str]):
+        self.names = tuple(permissions)
+        exact = set()
+        self._allow_all = False
+        self._prefixes: Dict = {}
+        self._suffixes: Dict = {}
+        self._decisions: Dict[str, bool] = {}
+        patterns = []
+
+        for permission in self.names:
+            wildcards = permission.count(WILDCARD)
+            if permission == WILDCARD:
+                self._allow_all = True
+            elif wildcards == 0:
+                exact.add(permission)
+            elif wildcards == 1 and permission.endswith(WILDCARD):
+                _insert(self._prefixes, permission[:-1])
+            elif wildcards == 1 and permission.startswith(WILDCARD):
+                _insert(self._suffixes, permission[:0:-1])
+            else:
+                patterns.append(".*".join(re.escape(part) for part in permission.split(WILDCARD)))
+        self._exact = frozenset(exact)
+        self._pattern = re.compile("|".join(patterns)) if patterns else None
+
+    def allows(self, permission: str) -> bool:
+        decision = self._decisions.get(permission)
+        if decision is None:
+            decision = (
+                self._allow_all
+                or permission in self._exact
+                or (bool(self._prefixes) and _has_pattern_for(self._prefixes, permission))
+                or (bool(self._suffixes) and _has_pattern_for(self._suffixes, reversed(permission)))
+                or (self._pattern is not None and self._pattern.fullmatch(permission) is not None)
+            )
+            self._decisions[permission] = decision
+        return decision
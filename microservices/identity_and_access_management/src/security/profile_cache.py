@@ -0,0 +1,47 @@
+import time
+from collections import OrderedDict
+
+
+class UserProfileCache:
+    """
+    In-process LRU cache of user profiles served by /me
+    - keyed by user id, password never stored
+    - entries expire after `ttl` seconds so changes made
+      through other workers are picked up
+    - endpoints changing a user call invalidate on this worker
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            self._entries.pop(user_id, None)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, user_id, profile):
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl, profile)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
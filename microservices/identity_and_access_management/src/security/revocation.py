@@ -0,0 +1,59 @@
+import time
+
+import redis.asyncio
+
+# article and review workers follow this stream to keep their local filters
+REVOKED_TOKENS_STREAM = "revoked_tokens"
+
+
+def _revoked_key(jti):
+    return f"revoked:jti:{jti}"
+
+
+class TokenRevocationStore:
+    """
+    Revoked jtis are written to redis twice
+    - as a key with ttl until token exp, for exact lookups in IAM
+    - to a stream other services follow incrementally
+    stream entries older than the longest token lifetime are trimmed
+    since tokens they revoke are expired anyway
+    """
+
+    def __init__(self, url, max_token_ttl):
+        self._redis = redis.asyncio.from_url(url, decode_responses=True)
+        self.max_token_ttl = max_token_ttl
+
+    def _publish(self, pipe, jti, exp, now):
+        pipe.xadd(
+            REVOKED_TOKENS_STREAM, {"jti": jti, "exp": int(exp)},
+            # stream ids are ms timestamps
+            minid=int((now - self.max_token_ttl) * 1000), approximate=True
+        )
+
+    async def revoke(self, jti, exp):
+        now = time.time()
+        ttl = max(int(exp - now), 1)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.set(_revoked_key(jti), exp, ex=ttl)
+            self._publish(pipe, jti, exp, now)
+            await pipe.execute()
+
+    async def claim(self, jti, exp):
+        """
+        Revokes jti only if it is not revoked yet, False if it already was
+        single SET NX so exactly one of concurrent callers wins
+        """
+        now = time.time()
+        ttl = max(int(exp - now), 1)
+        if not await self._redis.set(_revoked_key(jti), exp, ex=ttl, nx=True):
+            return False
+        async with self._redis.pipeline(transaction=False) as pipe:
+            self._publish(pipe, jti, exp, now)
+            await pipe.execute()
+        return True
+
+    async def is_revoked(self, jti):
+        return bool(await self._redis.exists(_revoked_key(jti)))
+
+    async def close(self):
+        await self._redis.close()
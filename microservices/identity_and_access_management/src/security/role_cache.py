@@ -0,0 +1,45 @@
+import time
+
+from sqlmodel import select
+
+from src.models.roles import RoleModel
+
+
+class RolePermissionsCache:
+    """
+    In-process cache of role name -> permissions
+    - roles change rarely but are read on every token issue
+    - entries expire after `ttl` seconds so role changes made
+      through other workers are picked up without a restart
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+
+    async def get(self, session, role_name):
+        if not role_name:
+            return []
+
+        entry = self._entries.get(role_name)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        # role name is primary key, single index lookup
+        permissions = (await session.exec(
+            select(RoleModel.permissions).where(RoleModel.name == role_name)
+        )).first()
+        permissions = list(permissions or [])
+        if self.ttl > 0:
+            self._entries[role_name] = (time.monotonic() + self.ttl, permissions)
+        return permissions
+
+    def invalidate(self, role_name):
+        self._entries.pop(role_name, None)
+
+    def stats(self):
+        return {"size": len(self._entries), "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
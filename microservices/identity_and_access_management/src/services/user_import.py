@@ -0,0 +1,194 @@
+import asyncio
+import csv
+import json
+
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+
+from src.models.roles import RoleModel
+from src.models.users import UserImportModel, UserModel
+from src.security.password_hasher import _hash_passwords
+
+# 7 columns per row, stays far below postgres 32767 bind parameter limit
+DEFAULT_BATCH_SIZE = 1000
+
+
+def iter_rows(stream, input_format):
+    """Yield (line_number, raw row) from ndjson or csv text stream"""
+    if input_format == "csv":
+        # header is line 1
+        for line_number, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_number, {key: value for key, value in row.items() if value != ""}
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield line_number, exc
+
+
+def _validation_error(exc):
+    return "; ".join(
+        "{}: {}".format(".".join(str(part) for part in error["loc"]), error["msg"]) for error in exc.errors()
+    )
+
+
+class UserImporter:
+    """
+    Bulk user import
+    - rows validated and checked against role names loaded once
+    - passwords hashed in chunks across a process pool, next batch
+      is hashed while previous one is inserted
+    - each batch is one multi-row insert, existing emails are skipped
+      and reported so one bad row never aborts the batch
+    - a batch failing to hash or insert never aborts the import, a failed
+      insert is retried row by row so only offending rows fail
+    - every failed row reported as {"line", "email", "error"}, their
+      line numbers also returned in the summary
+    """
+
+    def __init__(self, pg_session, pool, workers, scheme, rounds, batch_size=DEFAULT_BATCH_SIZE, on_error=None):
+        self.pg_session = pg_session
+        self.pool = pool
+        self.workers = workers
+        self.scheme = scheme
+        self.rounds = rounds
+        self.batch_size = batch_size
+        self.imported = 0
+        # already existing emails, reported but not failures
+        self.skipped = 0
+        self.skipped_lines = []
+        self.failed = 0
+        self.failed_lines = []
+        # errors kept in memory unless caller streams them
+        self.errors = []
+        self.on_error = on_error or self.errors.append
+        self._role_names = set()
+        self._seen_emails = set()
+
+    def _fail(self, line_number, email, error):
+        self.failed += 1
+        self.failed_lines.append(line_number)
+        self.on_error({"line": line_number, "email": email, "error": error})
+
+    def _skip(self, line_number, email):
+        self.skipped += 1
+        self.skipped_lines.append(line_number)
+        self.on_error({"line": line_number, "email": email, "error": "email already exists"})
+
+    async def load_roles(self):
+        async with self.pg_session() as session:
+            self._role_names = set((await session.exec(select(RoleModel.name))).all())
+
+    def validate(self, line_number, raw):
+        if isinstance(raw, Exception):
+            self._fail(line_number, None, "invalid json: {}".format(raw))
+            return None
+        try:
+            user = UserImportModel.model_validate(raw)
+        except ValidationError as exc:
+            self._fail(line_number, raw.get("email") if isinstance(raw, dict) else None, _validation_error(exc))
+            return None
+        if user.role_id is not None and user.role_id not in self._role_names:
+            self._fail(line_number, user.email, "role not found: {}".format(user.role_id))
+            return None
+        # same email twice in input, first one wins
+        if user.email in self._seen_emails:
+            self._fail(line_number, user.email, "duplicate email in input")
+            return None
+        self._seen_emails.add(user.email)
+        return user
+
+    async def _hash(self, batch):
+        passwords = [user.password for _, user in batch]
+        chunk_size = max(len(passwords) // self.workers, 1)
+        chunks = [passwords[i:i + chunk_size] for i in range(0, len(passwords), chunk_size)]
+        try:
+            hashed_chunks = await asyncio.gather(*[
+                asyncio.wrap_future(self.pool.submit(_hash_passwords, chunk, self.scheme, self.rounds))
+                for chunk in chunks
+            ])
+        except Exception as exc:
+            # e.g. broken pool, nothing of this batch was written
+            for line_number, user in batch:
+                self._fail(line_number, user.email, "password hashing failed: {}".format(exc))
+            return None
+        return [hashed for chunk in hashed_chunks for hashed in chunk]
+
+    async def _insert_values(self, values):
+        statement = (
+            insert(UserModel)
+            .values(values)
+            .on_conflict_do_nothing(index_elements=["email"])
+            .returning(UserModel.email)
+        )
+        async with self.pg_session() as session:
+            inserted = set((await session.execute(statement)).scalars().all())
+            await session.commit()
+        return inserted
+
+    async def _insert(self, batch, hashed_passwords):
+        values = [
+            {"full_name": user.full_name, "email": user.email, "password": hashed, "role_id": user.role_id}
+            for (_, user), hashed in zip(batch, hashed_passwords)
+        ]
+        failed_emails = set()
+        try:
+            inserted = await self._insert_values(values)
+        except Exception:
+            # e.g. role deleted meanwhile (foreign key), batch was rolled back
+            inserted = set()
+            for (line_number, user), row in zip(batch, values):
+                try:
+                    inserted |= await self._insert_values([row])
+                except Exception as exc:
+                    failed_emails.add(user.email)
+                    self._fail(line_number, user.email, "insert failed: {}".format(getattr(exc, "orig", exc)))
+
+        self.imported += len(inserted)
+        for line_number, user in batch:
+            if user.email not in inserted and user.email not in failed_emails:
+                self._skip(line_number, user.email)
+
+    async def run(self, rows):
+        await self.load_roles()
+
+        pending_insert = None
+        batch = []
+
+        async def flush(batch):
+            nonlocal pending_insert
+            hashed_passwords = await self._hash(batch)
+            if hashed_passwords is None:
+                return
+            if pending_insert:
+                await pending_insert
+            pending_insert = asyncio.ensure_future(self._insert(batch, hashed_passwords))
+
+        for line_number, raw in rows:
+            user = self.validate(line_number, raw)
+            if user is None:
+                continue
+            batch.append((line_number, user))
+            if len(batch) >= self.batch_size:
+                await flush(batch)
+                batch = []
+
+        if batch:
+            await flush(batch)
+        if pending_insert:
+            await pending_insert
+
+        return {
+            "imported": self.imported,
+            "skipped": self.skipped,
+            "skipped_lines": self.skipped_lines,
+            "failed": self.failed,
+            "failed_lines": self.failed_lines,
+        }
+
@@ -1,4 +1,6 @@
+import jwt
 import pytest
+import uuid
 
 from fastapi.testclient import TestClient
 from sqlmodel import SQLModel
@@ -6,6 +8,9 @@ from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.sql import text
 
 from src import create_fastapi_app
+from src.security.exceptions import AppException
+from src.security.jwt_helpers import TokenSigner, generate_jwt_token
+from src.security.password_hasher import build_crypt_context
 from configs.test import test_config
 
 @pytest.fixture
@@ -51,6 +56,27 @@ async def test_user_create(client):
         assert response.status_code == 201
 
 
+        # permissions are carried as registry bitmap
+        access_token_claims = jwt.decode(response.json()["access_token"], options={"verify_signature": False})
+        assert "prm" not in access_token_claims
+        assert access_token_claims["prv"] >= 1
+
+        registry = client.get("/api/v1/permissions").json()
+        assert registry["version"] >= access_token_claims["prv"]
+        assert "articles_create" in registry["permissions"]
+
+        # new access token from refresh token, without password
+        refresh_response = client.post("/api/v1/tokens/refresh", json={"refresh_token": response.json()["refresh_token"]})
+        assert refresh_response.status_code == 201
+        refreshed_claims = jwt.decode(refresh_response.json()["access_token"], options={"verify_signature": False})
+        assert refreshed_claims["typ"] == "ac"
+        assert refreshed_claims["pbm"] == access_token_claims["pbm"]
+
+        # access token can not be used as refresh token
+        with pytest.raises(AppException) as exc_info:
+            client.post("/api/v1/tokens/refresh", json={"refresh_token": response.json()["access_token"]})
+        assert exc_info.value.status_code == 401
+
         headers = {
             "Authorization": f"Bearer {response.json()['access_token']}",
         }
@@ -63,3 +89,156 @@ async def test_user_create(client):
         async with pg_engine.begin() as connection:
             await connection.execute(text('DROP TABLE IF EXISTS users CASCADE;'))
             await connection.execute(text('DROP TABLE IF EXISTS roles CASCADE;'))
+            await connection.execute(text('DROP TABLE IF EXISTS permissions CASCADE;'))
+
+@pytest.mark.asyncio
+async def test_jwks(client):
+    with client:
+        response = client.get("/api/v1/jwks")
+
+        assert response.status_code == 200
+        keys = response.json()["keys"]
+        assert len(keys) >= 1
+        # active signing key must always be published
+        assert client.app.signing_keys.active.kid in [key["kid"] for key in keys]
+        assert all(key.get("alg") and key.get("use") == "sig" for key in keys)
+
+
+def test_password_hash_rounds():
+    # scheme's own default cost unless set explicitly
+    context = build_crypt_context("pbkdf2_sha256")
+    assert context.hash("123123123").startswith("$pbkdf2-sha256$29000$")
+    # a cost meant for bcrypt would make pbkdf2 trivially brute-forceable
+    with pytest.raises(ValueError):
+        build_crypt_context("pbkdf2_sha256", 12)
+    assert context.needs_update(build_crypt_context("bcrypt", 10).hash("123123123"))
+    # stronger hashes are never rehashed down
+    assert not build_crypt_context("bcrypt").needs_update(build_crypt_context("bcrypt", 13).hash("123123123"))
+
+
+def test_token_pair_jtis(client):
+    with client:
+        signer = TokenSigner(client.app.signing_keys.active)
+    access_token, refresh_token = generate_jwt_token(uuid.uuid4(), signer, 60, 120)
+    access_claims = jwt.decode(access_token, options={"verify_signature": False})
+    refresh_claims = jwt.decode(refresh_token, options={"verify_signature": False})
+    assert (access_claims["typ"], refresh_claims["typ"]) == ("ac", "rf")
+    # revoked and rotated per token
+    assert access_claims["jti"] != refresh_claims["jti"]
+
+
+@pytest.mark.asyncio
+async def test_password_hash_upgraded_on_login():
+    app = create_fastapi_app({**test_config, "password_hash_scheme": "pbkdf2_sha256"})
+    with TestClient(app) as client:
+        from src.models.users import UserModel
+        from src.models.roles import RoleModel
+
+        pg_engine = create_async_engine(client.app.config["postgres_connection_string"])
+        async with pg_engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+
+        role_payload = {"name": "test_role", "permissions": ["articles_create"]}
+        response = client.post("api/v1/roles", json=role_payload)
+        assert response.status_code == 201
+
+        user_payload = {
+            "full_name": "johnie walker",
+            "email": "johniewalker@gmail.com",
+            "password": "123123123",
+            "role_id": "test_role"
+        }
+        response = client.post("/api/v1/users", json=user_payload)
+        assert response.status_code == 201
+
+        # stored before the scheme change, as a weaker bcrypt hash
+        async with pg_engine.begin() as connection:
+            await connection.execute(
+                text("UPDATE users SET password = :password WHERE email = :email"),
+                {"password": build_crypt_context("bcrypt", 10).hash("123123123"), "email": "johniewalker@gmail.com"}
+            )
+
+        token_create_payload = {"email": "johniewalker@gmail.com", "password": "123123123"}
+        response = client.post("/api/v1/tokens", json=token_create_payload)
+        assert response.status_code == 201
+
+        # rehashed by background task after the login response
+        async with pg_engine.begin() as connection:
+            password = (await connection.execute(
+                text("SELECT password FROM users WHERE email = :email"), {"email": "johniewalker@gmail.com"}
+            )).scalar_one()
+        assert password.startswith("$pbkdf2-sha256$29000$")
+
+        response = client.post("/api/v1/tokens", json=token_create_payload)
+        assert response.status_code == 201
+
+        # teardown test database
+        async with pg_engine.begin() as connection:
+            await connection.execute(text('DROP TABLE IF EXISTS users CASCADE;'))
+            await connection.execute(text('DROP TABLE IF EXISTS roles CASCADE;'))
+            await connection.execute(text('DROP TABLE IF EXISTS permissions CASCADE;'))
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_rotation_concurrent():
+    import asyncio
+    import httpx
+
+    # as with REFRESH_TOKEN_ROTATION=true
+    app = create_fastapi_app({**test_config, "refresh_token_rotation": True})
+    with TestClient(app) as client:
+        from src.models.users import UserModel
+        from src.models.roles import RoleModel
+
+        pg_engine = create_async_engine(client.app.config["postgres_connection_string"])
+        async with pg_engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+
+        role_payload = {"name": "test_role", "permissions": ["articles_create"]}
+        response = client.post("api/v1/roles", json=role_payload)
+        assert response.status_code == 201
+
+        user_payload = {
+            "full_name": "johnie walker",
+            "email": "johniewalker@gmail.com",
+            "password": "123123123",
+            "role_id": "test_role"
+        }
+        response = client.post("/api/v1/users", json=user_payload)
+        assert response.status_code == 201
+
+        response = client.post("/api/v1/tokens", json={"email": "johniewalker@gmail.com", "password": "123123123"})
+        assert response.status_code == 201
+        refresh_payload = {"refresh_token": response.json()["refresh_token"]}
+        access_token = response.json()["access_token"]
+
+        # same refresh token sent twice at once, only one gets a new pair
+        async def refresh_twice():
+            transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as async_client:
+                return await asyncio.gather(*[
+                    async_client.post("/api/v1/tokens/refresh", json=refresh_payload) for _ in range(2)
+                ])
+
+        responses = client.portal.call(refresh_twice)
+        assert sorted(response.status_code for response in responses) == [201, 401]
+
+        # rotating the refresh token leaves its access token valid
+        response = client.get("/api/v1/me", headers={"Authorization": f"Bearer {access_token}"})
+        assert response.status_code == 200
+
+        # rotated token can be refreshed once more
+        rotated = next(response for response in responses if response.status_code == 201).json()
+        rotated_claims = jwt.decode(rotated["access_token"], options={"verify_signature": False})
+        assert rotated_claims["jti"] != jwt.decode(rotated["refresh_token"], options={"verify_signature": False})["jti"]
+        # revoking the access token leaves its refresh token valid
+        response = client.post("/api/v1/tokens/revoke", json={"token": rotated["access_token"]})
+        assert response.status_code == 204
+        response = client.post("/api/v1/tokens/refresh", json={"refresh_token": rotated["refresh_token"]})
+        assert response.status_code == 201
+
+        # teardown test database
+        async with pg_engine.begin() as connection:
+            await connection.execute(text('DROP TABLE IF EXISTS users CASCADE;'))
+            await connection.execute(text('DROP TABLE IF EXISTS roles CASCADE;'))
+            await connection.execute(text('DROP TABLE IF EXISTS permissions CASCADE;'))
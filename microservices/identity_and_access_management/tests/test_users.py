@@ -45,4 +45,183 @@ async def test_success_user_create(client):
         async with pg_engine.begin() as connection:
             await connection.execute(text('DROP TABLE IF EXISTS users CASCADE;'))
             await connection.execute(text('DROP TABLE IF EXISTS roles CASCADE;'))
+            await connection.execute(text('DROP TABLE IF EXISTS permissions CASCADE;'))
 
+
+
+@pytest.mark.asyncio
+async def test_password_hashing_admission_control():
+    # passwords are hashed before any database access, error responses
+    # are asserted so server exceptions must not be raised
+    app = create_fastapi_app({**test_config, "password_hash_workers": 1, "password_hash_max_wait": 0.1})
+    with TestClient(app, raise_server_exceptions=False) as client:
+        hasher = client.app.password_hasher
+        user_payload = {
+            "full_name": "johnie walker",
+            "email": "johniewalker@gmail.com",
+            "password": "123123123",
+            "role_id": "test_role"
+        }
+
+        # every hashing slot busy, request times out waiting for one
+        client.portal.call(hasher._slots.acquire)
+        response = client.post("/api/v1/users", json=user_payload)
+        assert response.status_code == 503
+        assert response.json()["error_code"] == "exceptions.passwordQueueTimeout"
+        assert response.headers["retry-after"] == "1"
+        hasher._slots.release()
+
+        # queue full, rejected right away
+        max_queue, hasher.max_queue = hasher.max_queue, 0
+        response = client.post("/api/v1/users", json=user_payload)
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "1"
+        hasher.max_queue = max_queue
+
+        # pool not accepting work
+        hasher._pool.shutdown()
+        response = client.post("/api/v1/users", json=user_payload)
+        assert response.status_code == 503
+        assert response.json()["error_code"] == "exceptions.passwordServiceUnavailable"
+        assert response.headers["retry-after"] == "1"
+
+        assert client.app.password_hasher.stats()["rejected_queue_full"] == 1
+        assert client.app.password_hasher.stats()["rejected_wait_timeout"] == 1
+        assert client.app.password_hasher.stats()["rejected_unavailable"] == 1
+        # rejected or failed work is not counted as completed hashing
+        assert client.app.password_hasher.stats()["completed"] == 0
+        assert client.app.password_hasher.stats()["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_bulk_user_import(client):
+    with client as client:
+        import io
+        from concurrent.futures import ProcessPoolExecutor
+        from src.models.users import UserModel
+        from src.models.roles import RoleModel
+        from src.services.user_import import UserImporter, iter_rows
+
+        pg_engine = create_async_engine(client.app.config["postgres_connection_string"])
+        async with pg_engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+
+        role_payload = {"name": "test_role", "permissions": ["articles_create"]}
+        response = client.post("api/v1/roles", json=role_payload)
+        assert response.status_code == 201
+
+        user_payload = {
+            "full_name": "johnie walker",
+            "email": "johniewalker@gmail.com",
+            "password": "123123123",
+            "role_id": "test_role"
+        }
+        response = client.post("/api/v1/users", json=user_payload)
+        assert response.status_code == 201
+
+        stream = io.StringIO(
+            "full_name,email,password,role_id\n"
+            "jack daniels,jackdaniels@gmail.com,123123123,test_role\n"
+            "jim beam,jimbeam@gmail.com,123123123,\n"
+            "not an email,notanemail,123123123,test_role\n"
+            "unknown role,unknownrole@gmail.com,123123123,missing_role\n"
+            "johnie walker,johniewalker@gmail.com,123123123,test_role\n"
+        )
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            importer = UserImporter(client.app.pg_session, pool, 2, "bcrypt", None, batch_size=2)
+            summary = await importer.run(iter_rows(stream, "csv"))
+
+        # existing email is skipped, not failed
+        assert summary == {"imported": 2, "skipped": 1, "skipped_lines": [6], "failed": 2, "failed_lines": [4, 5]}
+        assert [error["line"] for error in importer.errors] == [4, 5, 6]
+        assert importer.errors[2]["error"] == "email already exists"
+
+        # imported users can login
+        response = client.post("/api/v1/tokens", json={"email": "jackdaniels@gmail.com", "password": "123123123"})
+        assert response.status_code == 201
+
+        # role known at start but missing on insert, e.g. deleted meanwhile
+        stream = io.StringIO(
+            "full_name,email,password,role_id\n"
+            "jose cuervo,josecuervo@gmail.com,123123123,test_role\n"
+            "ghost,ghost@gmail.com,123123123,deleted_role\n"
+            "glen fiddich,glenfiddich@gmail.com,123123123,test_role\n"
+        )
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            importer = UserImporter(client.app.pg_session, pool, 2, "bcrypt", None, batch_size=2)
+            load_roles = importer.load_roles
+
+            async def load_stale_roles():
+                await load_roles()
+                importer._role_names.add("deleted_role")
+
+            importer.load_roles = load_stale_roles
+            summary = await importer.run(iter_rows(stream, "csv"))
+
+        # failing batch retried row by row, rows around the bad one imported
+        assert summary == {"imported": 2, "skipped": 0, "skipped_lines": [], "failed": 1, "failed_lines": [3]}
+        assert importer.errors[0]["error"].startswith("insert failed")
+        response = client.post("/api/v1/tokens", json={"email": "josecuervo@gmail.com", "password": "123123123"})
+        assert response.status_code == 201
+
+        # teardown test database
+        async with pg_engine.begin() as connection:
+            await connection.execute(text('DROP TABLE IF EXISTS users CASCADE;'))
+            await connection.execute(text('DROP TABLE IF EXISTS roles CASCADE;'))
+            await connection.execute(text('DROP TABLE IF EXISTS permissions CASCADE;'))
+
+
+@pytest.mark.asyncio
+async def test_list_users_keyset_pagination(client):
+    with client as client:
+        from src.models.users import UserModel
+        from src.models.roles import RoleModel
+
+        pg_engine = create_async_engine(client.app.config["postgres_connection_string"])
+        async with pg_engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+
+        role_payload = {"name": "test_role", "permissions": ["list_users", "get_user"]}
+        response = client.post("api/v1/roles", json=role_payload)
+        assert response.status_code == 201
+
+        for index in range(3):
+            user_payload = {
+                "full_name": f"johnie walker {index}",
+                "email": f"johniewalker{index}@gmail.com",
+                "password": "123123123",
+                "role_id": "test_role"
+            }
+            response = client.post("/api/v1/users", json=user_payload)
+            assert response.status_code == 201
+
+        response = client.post("/api/v1/tokens", json={"email": "johniewalker0@gmail.com", "password": "123123123"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        emails = []
+        cursor = None
+        while True:
+            params = {"limit": 2, "fields": "id,email"}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get("/api/v1/users", params=params, headers=headers)
+            assert response.status_code == 200
+            for user in response.json()["users"]:
+                assert set(user) == {"id", "email"}
+                emails.append(user["email"])
+            cursor = response.json()["next_cursor"]
+            if not cursor:
+                break
+        assert emails == [f"johniewalker{index}@gmail.com" for index in range(3)]
+
+        user_id = response.json()["users"][-1]["id"]
+        response = client.get(f"/api/v1/users/{user_id}", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["email"] == "johniewalker2@gmail.com"
+        assert "password" not in response.json()
+
+        # teardown test database
+        async with pg_engine.begin() as connection:
+            await connection.execute(text('DROP TABLE IF EXISTS users CASCADE;'))
+            await connection.execute(text('DROP TABLE IF EXISTS roles CASCADE;'))
+            await connection.execute(text('DROP TABLE IF EXISTS permissions CASCADE;'))
@@ -1,7 +1,8 @@
-from fastapi import Request, Depends
+from fastapi import Request, Depends, Response
 
 from src.models.reviews import ReviewCreateModel, ReviewUpdateModel
-from src.models import to_jsonable, QueryParamsModel
+from src.models import QueryParamsModel
+from src.api.responses import MongoJSONResponse
 from src.security.auth import authenticate_and_authorize
 
 def init_reviews_api(app):
@@ -42,10 +43,9 @@ def init_reviews_api(app):
             review_id: str,
             current_user = Depends(authenticate_and_authorize),
     ):
-        review = await request.app.review_service.get_review(review_id)
-        payload = review.model_dump()
-        payload["_id"] = review_id
-        return payload
+        body = await request.app.review_service.get_review_body(review_id)
+        # body cached pre-encoded, no model is built on a cache hit
+        return Response(content=body, media_type="application/json")
 
     @app.post("/api/v1/reviews/query", status_code=200)
     async def query_reviews(
@@ -54,4 +54,5 @@ def init_reviews_api(app):
     ):
         documents = await request.app.review_service.query_reviews(query_params)
 
-        return to_jsonable(documents)
+        # returned as a response so fastapi skips jsonable_encoder
+        return MongoJSONResponse(documents)
@@ -0,0 +1,79 @@
+import json
+import struct
+from typing import Any, Optional
+
+import lz4.frame
+import orjson
+import zstandard
+
+from src.models import dump_json
+
+# first byte of every stored value, readers accept every format so
+# workers with different settings can run side by side during rollout
+FORMAT_ORJSON = 0x01
+FORMAT_ORJSON_ZSTD = 0x02
+FORMAT_ORJSON_LZ4 = 0x03
+# bytes values, fresh_until double + payload stored as is
+FORMAT_RAW = 0x04
+FORMAT_RAW_ZSTD = 0x05
+FORMAT_RAW_LZ4 = 0x06
+FRESH_UNTIL = struct.Struct("<d")
+# values written before the codec existed are json text, always an object
+LEGACY_JSON = ord("{")
+
+COMPRESSIONS = {None: FORMAT_ORJSON, "zstd": FORMAT_ORJSON_ZSTD, "lz4": FORMAT_ORJSON_LZ4}
+RAW_FORMATS = {FORMAT_ORJSON: FORMAT_RAW, FORMAT_ORJSON_ZSTD: FORMAT_RAW_ZSTD, FORMAT_ORJSON_LZ4: FORMAT_RAW_LZ4}
+
+
+class CacheCodec:
+    """
+    Encodes cached values as one format byte + orjson payload
+    - payloads of at least `compression_threshold` bytes are compressed
+      with zstd or lz4 when `compression` is set
+    - envelopes holding bytes, e.g. encoded response bodies, are stored
+      as binary envelope so bytes are neither escaped nor re-encoded
+    - legacy json text values are still decoded
+    """
+
+    def __init__(self, compression: Optional[str] = None, compression_threshold: int = 1024):
+        if compression not in COMPRESSIONS:
+            raise ValueError("unsupported cache compression {}".format(compression))
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        # compressor objects are reused, not shared between threads
+        self._zstd_compressor = zstandard.ZstdCompressor()
+        self._zstd_decompressor = zstandard.ZstdDecompressor()
+
+    def _compress(self, payload: bytes):
+        if self.compression is None or len(payload) < self.compression_threshold:
+            return FORMAT_ORJSON, payload
+        if self.compression == "zstd":
+            return FORMAT_ORJSON_ZSTD, self._zstd_compressor.compress(payload)
+        return FORMAT_ORJSON_LZ4, lz4.frame.compress(payload)
+
+    def encode(self, value: Any) -> bytes:
+        # {"value": bytes, "fresh_until"} envelopes are not json encodable
+        if isinstance(value, dict) and isinstance(value.get("value"), bytes):
+            fmt, payload = self._compress(value["value"])
+            return bytes((RAW_FORMATS[fmt],)) + FRESH_UNTIL.pack(value["fresh_until"]) + payload
+        fmt, payload = self._compress(dump_json(value))
+        return bytes((fmt,)) + payload
+
+    def decode(self, data: bytes) -> Any:
+        fmt = data[0]
+        if fmt == FORMAT_ORJSON:
+            return orjson.loads(memoryview(data)[1:])
+        if fmt == FORMAT_ORJSON_ZSTD:
+            return orjson.loads(self._zstd_decompressor.decompress(data[1:]))
+        if fmt == FORMAT_ORJSON_LZ4:
+            return orjson.loads(lz4.frame.decompress(data[1:]))
+        if fmt in (FORMAT_RAW, FORMAT_RAW_ZSTD, FORMAT_RAW_LZ4):
+            payload = data[1 + FRESH_UNTIL.size:]
+            if fmt == FORMAT_RAW_ZSTD:
+                payload = self._zstd_decompressor.decompress(payload)
+            elif fmt == FORMAT_RAW_LZ4:
+                payload = lz4.frame.decompress(payload)
+            return {"value": payload, "fresh_until": FRESH_UNTIL.unpack_from(data, 1)[0]}
+        if fmt == LEGACY_JSON:
+            return json.loads(data)
+        raise ValueError("unknown cache value format {}".format(fmt))
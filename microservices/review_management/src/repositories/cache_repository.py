@@ -1,36 +1,246 @@
+import asyncio
 import json
+import logging
+import time
 import redis.asyncio
-from typing import Any, Optional, List
-from bson import ObjectId
+from redis.exceptions import WatchError
+from typing import Any, Awaitable, Callable, Dict, Tuple, Iterable, Optional, List
 
-from datetime import date, datetime
+from src.repositories.cache_codec import CacheCodec
+from src.repositories.local_cache import LocalCache
+from src.repositories.shared_cache import SharedMemoryCache
 
-def json_serial(obj):
-    """JSON serializer for objects not serializable by default json code"""
+logger = logging.getLogger(__name__)
 
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    if isinstance(obj, ObjectId):
-        return str(obj)
-    raise TypeError ("Type %s not serializable" % type(obj))
+# seconds one worker holds the right to refresh a stale key
+REFRESH_LOCK_TTL = 10
+# written keys are published here, every worker drops them from its L1 cache
+INVALIDATION_CHANNEL = "cache:invalidate"
+# seconds a tag version outlives its last invalidation, an expired
+# version only makes tagged writes read before it skip once
+TAG_VERSION_TTL = 3600
 
 
 class CacheRepository:
-    def __init__(self, url, encoding: str = "utf-8"):
-        self._redis = redis.asyncio.from_url(url, encoding=encoding, decode_responses=True)
+    """
+    Redis cache, values stored with a soft expiry (stale-while-revalidate)
+    - before soft expiry value is fresh
+    - after it value is still served but one worker, holding a short
+      SET NX lock, reloads it in background
+    - redis TTL is the hard expiry, nothing is served after it
+    - values are stored as bytes encoded by CacheCodec
+    - optional L1 LocalCache serves fresh values from process memory and
+      optional SharedMemoryCache from memory shared by workers of a host,
+      both used only while subscribed to INVALIDATION_CHANNEL
+    """
 
-    async def get(self, key: str) -> Optional[Any]:
+    def __init__(
+            self, url, encoding: str = "utf-8",
+            local_cache: Optional[LocalCache] = None, shared_cache: Optional[SharedMemoryCache] = None,
+            codec: Optional[CacheCodec] = None
+    ):
+        # binary values, keys and other replies are decoded where read
+        self._redis = redis.asyncio.from_url(url, encoding=encoding, decode_responses=False)
+        self._codec = codec or CacheCodec()
+        # strong refs, event loop keeps only weak ones to tasks
+        self._refresh_tasks = set()
+        self._local = local_cache
+        self._shared = shared_cache
+        self._subscribed = False
+
+    def _tiers_enabled(self) -> bool:
+        return (self._local is not None or self._shared is not None) and self._subscribed
+
+    def _local_get(self, key: str, decode: Callable[[bytes], Any]) -> Optional[Any]:
+        """Fresh value from L1, else from shared memory, None when neither has it."""
+        if not self._tiers_enabled():
+            return None
+        if self._local is not None:
+            value = self._local.get(key)
+            if value is not None:
+                return value
+        if self._shared is not None:
+            seq = self._local.invalidation_seq if self._local is not None else None
+            hit = self._shared.get(key)
+            if hit is not None:
+                raw, fresh_until = hit
+                value = decode(raw)
+                if seq is not None:
+                    self._local.set(key, value, fresh_until, len(raw), seq)
+                return value
+        return None
+
+    def _local_seq(self, key: str) -> Optional[Tuple[Optional[int], Optional[int]]]:
+        """Invalidation seqs taken before a redis read of key, passed back to _local_set."""
+        if not self._tiers_enabled():
+            return None
+        return (
+            self._local.invalidation_seq if self._local is not None else None,
+            self._shared.seq_of(key) if self._shared is not None else None,
+        )
+
+    def _local_set(self, key: str, value: Any, raw: bytes, fresh_until: float, seq) -> None:
+        if seq is None:
+            return
+        local_seq, shared_seq = seq
+        if local_seq is not None:
+            self._local.set(key, value, fresh_until, len(raw), local_seq)
+        if shared_seq is not None:
+            self._shared.set(key, raw, fresh_until, shared_seq)
+
+    def _drop(self, *keys: str) -> None:
+        if self._local is not None:
+            self._local.invalidate(*keys)
+        if self._shared is not None:
+            self._shared.invalidate(*keys)
+
+    def _invalidate(self, pipe, *keys: str) -> None:
+        """Drop keys from own tiers now and queue publish for other workers on pipe."""
+        if (self._local is None and self._shared is None) or not keys:
+            return
+        self._drop(*keys)
+        pipe.publish(INVALIDATION_CHANNEL, json.dumps(keys))
+
+    async def run_invalidation_loop(self) -> None:
+        if self._local is None and self._shared is None:
+            return
+        lost = False
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # invalidations sent while not subscribed are lost
+                if self._local is not None:
+                    self._local.clear()
+                # shared tier is host-wide, siblings subscribed all along kept
+                # it coherent unless this process is the one that lost its stream
+                if self._shared is not None and (self._shared.attach() or lost):
+                    self._shared.clear()
+                self._subscribed = True
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._drop(*json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("cache invalidation subscription failed: {}".format(exc))
+                await asyncio.sleep(1)
+            finally:
+                self._subscribed = False
+                lost = True
+                if self._shared is not None:
+                    self._shared.detach()
+                await pubsub.aclose()
+
+    def local_stats(self) -> Optional[dict]:
+        return self._local.stats() if self._local is not None else None
+
+    def shared_stats(self) -> Optional[dict]:
+        return self._shared.stats() if self._shared is not None else None
+
+    def _envelope(self, value: Any, ttl: int, soft_ttl: Optional[int]) -> bytes:
+        fresh_until = time.time() + (soft_ttl if soft_ttl is not None else ttl)
+        return self._codec.encode({"value": value, "fresh_until": fresh_until})
+
+    async def get(self, key: str, refresh: Optional[Callable[[], Awaitable[Any]]] = None) -> Optional[Any]:
+        """Cached value, stale values trigger `refresh` on a single worker."""
+        value = self._local_get(key, lambda raw: self._codec.decode(raw)["value"])
+        if value is not None:
+            return value
+
+        seq = self._local_seq(key)
         data = await self._redis.get(key)
-        return json.loads(data) if data else None
+        if not data:
+            return None
+        try:
+            envelope = self._codec.decode(data)
+        except ValueError as exc:
+            # written by a newer codec, treated as a miss and overwritten
+            logger.warning("cache value {} not decoded: {}".format(key, exc))
+            return None
+        if not isinstance(envelope, dict) or "fresh_until" not in envelope or "value" not in envelope:
+            # written before values were enveloped, refilled by caller
+            return None
+        if envelope["fresh_until"] > time.time():
+            self._local_set(key, envelope["value"], data, envelope["fresh_until"], seq)
+        elif refresh:
+            if await self._redis.set(f"lock:{key}", 1, nx=True, ex=REFRESH_LOCK_TTL):
+                task = asyncio.create_task(self._refresh(key, refresh))
+                self._refresh_tasks.add(task)
+                task.add_done_callback(self._refresh_tasks.discard)
+        return envelope["value"]
+
+    async def _refresh(self, key: str, refresh: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            # reloads from db and stores with a new soft expiry
+            await refresh()
+        except Exception as exc:
+            logger.warning("cache refresh of {} failed: {}".format(key, exc))
+        finally:
+            await self._redis.delete(f"lock:{key}")
 
-    async def set(self, key: str, value: Any, ttl: int = 60) -> None:
-        """Store JSON-serializable value with TTL (seconds)."""
-        await self._redis.set(key, json.dumps(value, default=json_serial), ex=ttl)
+    async def set(self, key: str, value: Any, ttl: int = 60, soft_ttl: Optional[int] = None) -> None:
+        """Store value encodable by CacheCodec with hard TTL and soft TTL (seconds)."""
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.set(key, self._envelope(value, ttl, soft_ttl), ex=ttl)
+            self._invalidate(pipe, key)
+            await pipe.execute()
 
     async def delete(self, *keys: str) -> None:
         if not keys:
             return
-        await self._redis.delete(*keys)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.delete(*keys)
+            self._invalidate(pipe, *keys)
+            await pipe.execute()
+
+    async def get_tag_versions(self, *tags: str) -> Dict[str, Optional[bytes]]:
+        """Versions of tags, taken before reading a value later stored with set_tagged."""
+        return dict(zip(tags, await self._redis.mget([f"tagver:{tag}" for tag in tags])))
+
+    async def set_tagged(
+            self, key: str, value: Any, tags: Iterable[str], ttl: int = 60, soft_ttl: Optional[int] = None,
+            versions: Optional[Dict[str, Optional[bytes]]] = None
+    ) -> bool:
+        """
+        Store value like set and add key to a redis set per tag
+        nothing is stored if a tag of `versions` was invalidated since
+        they were taken, value may have been read before that write
+        """
+        async with self._redis.pipeline(transaction=True) as pipe:
+            if versions:
+                version_keys = [f"tagver:{tag}" for tag in versions]
+                await pipe.watch(*version_keys)
+                if await pipe.mget(version_keys) != list(versions.values()):
+                    return False
+                pipe.multi()
+            pipe.set(key, self._envelope(value, ttl, soft_ttl), ex=ttl)
+            self._invalidate(pipe, key)
+            for tag in tags:
+                pipe.sadd(f"tag:{tag}", key)
+                # members share the ttl, set lives as long as its newest key
+                pipe.expire(f"tag:{tag}", ttl)
+            try:
+                await pipe.execute()
+            except WatchError:
+                return False
+        return True
+
+    async def invalidate_tags(self, *tags: str) -> None:
+        """Delete every key stored with any of the tags and bump their versions."""
+        if not tags:
+            return
+        async with self._redis.pipeline(transaction=True) as pipe:
+            for tag in tags:
+                pipe.smembers(f"tag:{tag}")
+            pipe.delete(*[f"tag:{tag}" for tag in tags])
+            for tag in tags:
+                pipe.incr(f"tagver:{tag}")
+                pipe.expire(f"tagver:{tag}", TAG_VERSION_TTL)
+            members = (await pipe.execute())[:len(tags)]
+        keys = {key.decode() for key in set().union(*members)}
+        if keys:
+            await self.delete(*keys)
 
     async def scan_keys(self, pattern: str, count: int = 100) -> List[str]:
         """Return list of keys matching pattern using SCAN (non-blocking)."""
@@ -40,7 +250,7 @@ class CacheRepository:
         while True:
             cur, keys = await self._redis.scan(cur, match=pattern, count=count)
             if keys:
-                found.extend(keys)
+                found.extend(key.decode() for key in keys)
             if cur == 0 or cur == b"0":
                 break
         return found
@@ -52,7 +262,9 @@ class CacheRepository:
             # chunk deletes to avoid overload
             chunk = 100
             for i in range(0, len(keys), chunk):
-                await self._redis.delete(*keys[i : i + chunk])
+                await self.delete(*keys[i : i + chunk])
 
     async def close(self) -> None:
-        await self._redis.close()
\ No newline at end of file
+        await self._redis.close()
+        if self._shared is not None:
+            self._shared.close()
\ No newline at end of file
@@ -1,38 +1,43 @@
 import hashlib
 import json
 from typing import Optional, Dict, Any
-from decimal import Decimal
 
-from fastapi.encoders import jsonable_encoder
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId, Decimal128
+from pymongo import ReturnDocument
+from pymongo.results import DeleteResult, UpdateResult
 from src.models.reviews import ReviewModel
+from src.models import dump_json
+from src.repositories.keyset import encode_cursor, is_projected, keyset_filter, keyset_sort, strip_field
+from src.repositories.single_flight import SingleFlight
 
-# TTLs in seconds
+# TTLs in seconds, hard expiry
 ENTITY_TTL = 300  # cached single-review (5 minutes)
 QUERY_TTL = 30  # cached query results (30 seconds)
+# after soft TTL cached value is served stale while one worker reloads it
+ENTITY_SOFT_TTL = 240
+QUERY_SOFT_TTL = 20
 
+# queries not bound to known articles, invalidated by every write
+ALL_REVIEWS_TAG = "review:query:all"
+
+
+def _response_body(model: ReviewModel, _id: str) -> bytes:
+    """GET response of the review, cached so hits skip pydantic and re-encoding"""
+    payload = model.model_dump()
+    # Note this id complexity caused by pydantic
+    payload["_id"] = _id
+    # same encoding MongoJSONResponse applies
+    return dump_json(payload)
 
-def _normalize_for_cache(doc: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Convert non-JSON serializable types into JSON-friendly ones
-    - ObjectId -> str
-    - Decimal128 -> float (or str if you prefer)
-    """
-    if not doc:
-        return doc
-
-    out = {}
-    for k, v in doc.items():
-        if isinstance(v, ObjectId):
-            out[k] = str(v)
-        elif isinstance(v, Decimal128):
-            out[k] = float(v.to_decimal())
-        elif isinstance(v, Decimal):
-            out[k] = float(v)
-        else:
-            out[k] = v
-    return out
+
+def _model_from_body(body: bytes) -> ReviewModel:
+    doc = json.loads(body)
+    _id = doc.pop("_id")
+    doc.pop("id", None)
+    model = ReviewModel(**doc)
+    model._id = _id
+    return model
 
 
 def _prepare_doc_for_model(doc) -> Dict[str, Any]:
@@ -52,6 +57,42 @@ def _prepare_doc_for_model(doc) -> Dict[str, Any]:
     return doc
 
 
+def _article_tag(article_id) -> str:
+    return f"review:query:article:{article_id}"
+
+
+def _query_tags(_filter, docs):
+    """
+    Articles a cached query result depends on
+    - filtered by article_id: only that article's reviews can change it
+    - filtered by review _id: only writes to returned reviews' articles
+    - anything else: any review write may change it
+    """
+    _filter = _filter or {}
+    article_id = _filter.get("article_id")
+    if isinstance(article_id, str):
+        return {_article_tag(article_id)}
+    if "_id" in _filter and docs and all(isinstance(doc.get("article_id"), str) for doc in docs):
+        return {_article_tag(doc["article_id"]) for doc in docs}
+    return {ALL_REVIEWS_TAG}
+
+
+def _version_tags(_filter):
+    """Tags whose invalidation by any write the query can see, known before reading"""
+    article_id = (_filter or {}).get("article_id")
+    if isinstance(article_id, str):
+        return [_article_tag(article_id)]
+    # every write invalidates it
+    return [ALL_REVIEWS_TAG]
+
+
+def _update_result(doc) -> UpdateResult:
+    # service layer expects update_one's result, updated_at is set on
+    # every update so a matched document is always a modified one
+    matched = 1 if doc else 0
+    return UpdateResult({"n": matched, "nModified": matched, "updatedExisting": bool(doc)}, acknowledged=True)
+
+
 def fingerprint(key_data: dict) -> str:
     """Stable hash for query cache keys."""
     raw = json.dumps(key_data, sort_keys=True, default=str)
@@ -59,55 +100,90 @@ def fingerprint(key_data: dict) -> str:
 
 
 class ReviewRepository:
-    def __init__(self, db: AsyncIOMotorDatabase, cache):
+    def __init__(self, db: AsyncIOMotorDatabase, cache, write_through: bool = False, single_flight=None):
         self.collection = db["reviews"]
         self.cache = cache
+        # concurrent reads of same key share one cache/db round trip
+        self.single_flight = single_flight or SingleFlight()
+        # cache entity from written document so read after write is a hit
+        self.write_through = write_through
+
+    async def _cache_entity(self, doc) -> bytes:
+        doc = _prepare_doc_for_model(dict(doc))
+        # todo fix this weird approach caused by pydantic :/
+        _id = doc.pop("id")
+        body = _response_body(ReviewModel(**doc), _id)
+        await self.cache.set(f"review:id:{_id}", body, ttl=ENTITY_TTL, soft_ttl=ENTITY_SOFT_TTL)
+        return body
 
     async def create(self, review_doc):
         result = await self.collection.insert_one(review_doc)
-        await self.cache.delete_pattern("review:query:*")
-        # todo maybe consider caching after create
+        await self.cache.invalidate_tags(_article_tag(review_doc["article_id"]), ALL_REVIEWS_TAG)
+        if self.write_through:
+            # insert_one adds _id to the inserted doc
+            await self._cache_entity(review_doc)
         return result
 
-    async def get_by_id(self, review_id: str):
+    async def get_by_id(self, review_id: str) -> Optional[ReviewModel]:
+        body = await self.get_body(review_id)
+        if body is None:
+            return None
+        return _model_from_body(body)
+
+    async def get_body(self, review_id: str) -> Optional[bytes]:
+        """Cached GET response body, pydantic runs only on misses."""
+        return await self.single_flight.do(f"review:id:{review_id}", lambda: self._get_body(review_id))
+
+    async def _get_body(self, review_id: str) -> Optional[bytes]:
         cache_key = f"review:id:{review_id}"
-        cached = await self.cache.get(cache_key)
-        if cached:
-            cached = dict(cached)
-            if "star_ratio" in cached:
-                try:
-                    cached["star_ratio"] = Decimal(str(cached["star_ratio"]))  # noqa
-                except KeyError:
-                    pass
-            return ReviewModel(**cached)
+        cached = await self.cache.get(cache_key, refresh=lambda: self._find_by_id(review_id))
+        # entries cached as documents or str bodies, before bytes were, are reloaded
+        if isinstance(cached, bytes):
+            return cached
+
+        return await self._find_by_id(review_id)
 
+    async def _find_by_id(self, review_id: str) -> Optional[bytes]:
         doc = await self.collection.find_one({"_id": ObjectId(review_id)})
         if not doc:
             return None
 
-        doc = _prepare_doc_for_model(doc)
-        # todo fix this weird approach caused by pydantic :/
-        _id = doc.pop("id")
-        model = ReviewModel(**doc)
-        model._id = _id
-        await self.cache.set(cache_key, _normalize_for_cache(jsonable_encoder(model)), ttl=ENTITY_TTL)
-        return model
+        return await self._cache_entity(doc)
 
     async def update(self, update_payload, review_id: str):
-        updated = await self.collection.update_one({"_id": ObjectId(review_id)}, {"$set": update_payload})
-        await self.cache.delete(f"review:id:{review_id}")
-        await self.cache.delete_pattern("review:query:*")
+        if self.write_through:
+            doc = await self.collection.find_one_and_update(
+                {"_id": ObjectId(review_id)}, {"$set": update_payload}, return_document=ReturnDocument.AFTER
+            )
+            # reports modified == matched, the service's "no changes" 409
+            # relies on it and holds since service always sets updated_at
+            updated = _update_result(doc)
+            if doc:
+                await self._cache_entity(doc)
+        else:
+            # article_id never changes on update, only needed for its tag
+            doc = await self.collection.find_one_and_update(
+                {"_id": ObjectId(review_id)}, {"$set": update_payload}, projection={"article_id": 1}
+            )
+            # reports modified == matched, the service's "no changes" 409
+            # relies on it and holds since service always sets updated_at
+            updated = _update_result(doc)
+            await self.cache.delete(f"review:id:{review_id}")
+        if doc:
+            await self.cache.invalidate_tags(_article_tag(doc["article_id"]), ALL_REVIEWS_TAG)
 
         return updated
 
     async def delete(self, review_id: str):
-        result = await self.collection.delete_one({"_id": ObjectId(review_id)})
+        # deleted doc returned to know which article's queries to invalidate
+        doc = await self.collection.find_one_and_delete({"_id": ObjectId(review_id)}, projection={"article_id": 1})
 
         await self.cache.delete(f"review:id:{review_id}")
-        await self.cache.delete_pattern("review:query:*")
-        return result
+        if doc:
+            await self.cache.invalidate_tags(_article_tag(doc["article_id"]), ALL_REVIEWS_TAG)
+        return DeleteResult({"n": 1 if doc else 0}, acknowledged=True)
 
-    async def query(self, skip, limit, _filter, sort_by, sort_dir, select):
+    async def query(self, skip, limit, _filter, sort_by, sort_dir, select, after=None):
         key_data = {
             "skip": skip,
             "limit": limit,
@@ -115,14 +191,27 @@ class ReviewRepository:
             "sort_by": sort_by,
             "sort_dir": sort_dir,
             "select": select,
+            "after": after,
         }
         cache_key = f"review:query:{fingerprint(key_data)}"
+        return await self.single_flight.do(
+            cache_key, lambda: self._query(cache_key, skip, limit, _filter, sort_by, sort_dir, select, after)
+        )
+
+    async def _query(self, cache_key, skip, limit, _filter, sort_by, sort_dir, select, after):
 
         # check cache
-        cached = await self.cache.get(cache_key)
+        cached = await self.cache.get(
+            cache_key, refresh=lambda: self._query_db(cache_key, skip, limit, _filter, sort_by, sort_dir, select, after)
+        )
         if cached:
             return cached
 
+        return await self._query_db(cache_key, skip, limit, _filter, sort_by, sort_dir, select, after)
+
+    async def _query_db(self, cache_key, skip, limit, _filter, sort_by, sort_dir, select, after):
+        # a write between the read and set_tagged would leave a stale page cached
+        versions = await self.cache.get_tag_versions(*_version_tags(_filter))
         mongo_filter = {}
 
         if _filter:
@@ -131,23 +220,38 @@ class ReviewRepository:
                 for key, value in _filter.items()
             }
 
+        if after is not None:
+            # range on (sort_by, _id) instead of walking skipped documents
+            after_filter = keyset_filter(sort_by, sort_dir, *after)
+            mongo_filter = {"$and": [mongo_filter, after_filter]} if mongo_filter else after_filter
+
         projection = None
+        unselected_sort_key = False
         if select:
             projection = {field: 1 for field in select}
             if "id" in projection and "_id" not in projection:
                 projection["_id"] = 1
                 del projection["id"]
+            # sort key is needed to build next cursor
+            unselected_sort_key = sort_by and sort_by != "_id" and not is_projected(sort_by, projection)
+            if unselected_sort_key:
+                projection[sort_by] = 1
 
         cursor = self.collection.find(mongo_filter, projection=projection)
-
-        if sort_by:
-            cursor = cursor.sort(sort_by, sort_dir)
-
+        cursor = cursor.sort(keyset_sort(sort_by, sort_dir))
         cursor = cursor.skip(skip).limit(limit)
 
         docs = await cursor.to_list(length=limit)
 
-        payload = {"count": len(docs), "docs": docs}
-        await self.cache.set(cache_key, payload, ttl=QUERY_TTL)
+        # full page, more documents may follow
+        next_cursor = encode_cursor(sort_by, sort_dir, docs[-1]) if docs and len(docs) == limit else None
+        if unselected_sort_key:
+            for doc in docs:
+                strip_field(doc, sort_by)
+
+        payload = {"count": len(docs), "docs": docs, "next_cursor": next_cursor}
+        await self.cache.set_tagged(
+            cache_key, payload, _query_tags(_filter, docs), ttl=QUERY_TTL, soft_ttl=QUERY_SOFT_TTL, versions=versions
+        )
 
         return payload
\ No newline at end of file
@@ -0,0 +1,223 @@
+import fcntl
+import glob
+import hashlib
+import mmap
+import os
+import re
+import struct
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+MAGIC = b"SHMCACH2"
+# magic, slot count, ways per set, slot data capacity
+HEADER = struct.Struct("<8sIII")
+# invalidation seq of each set, follows header
+SEQ = struct.Struct("<Q")
+# key hash (0 = empty), last access (monotonic ns), fresh until, key length, value length
+SLOT = struct.Struct("<QQdII")
+# slots searched per key, lru eviction happens inside this set
+WAYS = 8
+
+
+def _key_hash(key: bytes) -> int:
+    # python's hash() differs per process, blake2b is stable
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+class SharedMemoryCache:
+    """
+    Cache shared by all worker processes of a host through one mmap'ed file
+    - fixed slot hash table, set associative: key maps to a set of WAYS
+      slots, least recently used slot of the set is evicted
+    - every slot owns a fixed data region, memory is bounded by segment size
+      and values larger than a slot are not cached
+    - holds values as encoded by CacheCodec, as read from redis, each
+      process decodes on hit
+    - sets are guarded by fcntl range locks so processes only contend
+      on same set, fills racing with an invalidation are dropped using
+      an invalidation seq kept per set
+    - file name carries the layout, processes started with other settings
+      use their own file and a mapped file is never truncated, files of
+      other layouts no process holds a lock on are removed
+    - subscribed processes hold a shared lock on the byte past the segment,
+      released by the os when a process dies
+    """
+
+    def __init__(self, path: str, size: int = 64 * 1024 * 1024, slot_count: int = 4096):
+        slot_count -= slot_count % WAYS
+        self.slot_count = slot_count
+        self._set_count = slot_count // WAYS
+        self._seq_offset = HEADER.size
+        self._table_offset = self._seq_offset + self._set_count * SEQ.size
+        self._data_offset = self._table_offset + slot_count * SLOT.size
+        self.slot_capacity = (size - self._data_offset) // slot_count
+        if self.slot_capacity <= 0:
+            raise ValueError("shared cache size too small for {} slots".format(slot_count))
+        self.hits = 0
+        self.misses = 0
+
+        header = HEADER.pack(MAGIC, slot_count, WAYS, self.slot_capacity)
+        self.path = "{}.{}".format(path, hashlib.blake2b(header + struct.pack("<Q", size), digest_size=4).hexdigest())
+        self._size = size
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER.size, 0)
+        try:
+            # first process, file only ever grows so other mappings stay valid
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+            if os.pread(self._fd, HEADER.size, 0) != header:
+                os.pwrite(self._fd, header, 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER.size, 0)
+        self._mm = mmap.mmap(self._fd, size)
+        self._remove_unused_layouts(path)
+
+    def _remove_unused_layouts(self, path: str) -> None:
+        # unsuffixed path is the layout before names carried it
+        candidates = [path] + [
+            name for name in glob.glob(glob.escape(path) + ".*") if re.search(r"\.[0-9a-f]{8}$", name)
+        ]
+        for name in candidates:
+            if name == self.path or not os.path.isfile(name):
+                continue
+            try:
+                fd = os.open(name, os.O_RDWR)
+            except OSError:
+                continue
+            try:
+                # any lock means a process still uses it
+                fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.unlink(name)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+
+    def attach(self) -> bool:
+        """
+        Marks this process subscribed to invalidations, True when no other
+        process was, so invalidations may have been missed
+        """
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, self._size)
+            alone = True
+        except OSError:
+            alone = False
+        fcntl.lockf(self._fd, fcntl.LOCK_SH, 1, self._size)
+        return alone
+
+    def detach(self) -> None:
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, self._size)
+
+    @contextmanager
+    def _locked(self, start: int, length: int):
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+
+    def _set_of(self, key_hash: int) -> Tuple[int, int]:
+        first_slot = (key_hash % self._set_count) * WAYS
+        return first_slot, self._table_offset + first_slot * SLOT.size
+
+    def _seq_offset_of(self, first_slot: int) -> int:
+        return self._seq_offset + first_slot // WAYS * SEQ.size
+
+    def _slot_offsets(self, slot: int) -> Tuple[int, int]:
+        return self._table_offset + slot * SLOT.size, self._data_offset + slot * self.slot_capacity
+
+    def seq_of(self, key: str) -> int:
+        """Invalidation seq of key's set, read before a redis read and passed back to set."""
+        first_slot, _ = self._set_of(_key_hash(key.encode()))
+        return SEQ.unpack_from(self._mm, self._seq_offset_of(first_slot))[0]
+
+    def _bump_seq(self, first_slot: int) -> None:
+        # caller holds the set lock
+        offset = self._seq_offset_of(first_slot)
+        SEQ.pack_into(self._mm, offset, SEQ.unpack_from(self._mm, offset)[0] + 1)
+
+    def _find(self, first_slot: int, key_hash: int, key: bytes) -> Optional[int]:
+        for slot in range(first_slot, first_slot + WAYS):
+            record_offset, data_offset = self._slot_offsets(slot)
+            slot_hash, _, _, key_length, _ = SLOT.unpack_from(self._mm, record_offset)
+            if slot_hash == key_hash and self._mm[data_offset:data_offset + key_length] == key:
+                return slot
+        return None
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Raw value and its fresh_until, only fresh values are returned."""
+        key = key.encode()
+        key_hash = _key_hash(key)
+        first_slot, lock_offset = self._set_of(key_hash)
+        # exclusive, hits write the access time
+        with self._locked(lock_offset, WAYS * SLOT.size):
+            slot = self._find(first_slot, key_hash, key)
+            if slot is not None:
+                record_offset, data_offset = self._slot_offsets(slot)
+                _, _, fresh_until, key_length, value_length = SLOT.unpack_from(self._mm, record_offset)
+                if fresh_until > time.time():
+                    value = self._mm[data_offset + key_length:data_offset + key_length + value_length]
+                    struct.pack_into("<Q", self._mm, record_offset + 8, time.monotonic_ns())
+                    self.hits += 1
+                    return value, fresh_until
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: bytes, fresh_until: float, seq: int) -> None:
+        key = key.encode()
+        if len(key) + len(value) > self.slot_capacity:
+            return
+        key_hash = _key_hash(key)
+        first_slot, lock_offset = self._set_of(key_hash)
+        with self._locked(lock_offset, WAYS * SLOT.size):
+            # invalidated while value was read from redis, may be stale
+            if seq != SEQ.unpack_from(self._mm, self._seq_offset_of(first_slot))[0]:
+                return
+            slot = self._find(first_slot, key_hash, key)
+            if slot is None:
+                # empty or expired slot first, else least recently used
+                now = time.time()
+                candidates = []
+                for candidate in range(first_slot, first_slot + WAYS):
+                    slot_hash, last_access, slot_fresh_until, _, _ = SLOT.unpack_from(
+                        self._mm, self._slot_offsets(candidate)[0]
+                    )
+                    candidates.append((slot_hash != 0 and slot_fresh_until > now, last_access, candidate))
+                slot = min(candidates)[2]
+            record_offset, data_offset = self._slot_offsets(slot)
+            self._mm[data_offset:data_offset + len(key) + len(value)] = key + value
+            SLOT.pack_into(self._mm, record_offset, key_hash, time.monotonic_ns(), fresh_until, len(key), len(value))
+
+    def invalidate(self, *keys: str) -> None:
+        for key in keys:
+            key = key.encode()
+            key_hash = _key_hash(key)
+            first_slot, lock_offset = self._set_of(key_hash)
+            with self._locked(lock_offset, WAYS * SLOT.size):
+                # only fills of this set are dropped
+                self._bump_seq(first_slot)
+                slot = self._find(first_slot, key_hash, key)
+                if slot is not None:
+                    SLOT.pack_into(self._mm, self._slot_offsets(slot)[0], 0, 0, 0.0, 0, 0)
+
+    def clear(self) -> None:
+        table_length = self.slot_count * SLOT.size
+        # covers every set lock
+        with self._locked(self._table_offset, table_length):
+            for first_slot in range(0, self.slot_count, WAYS):
+                self._bump_seq(first_slot)
+            self._mm[self._table_offset:self._data_offset] = bytes(table_length)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "slots": self.slot_count,
+            "slot_capacity": self.slot_capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
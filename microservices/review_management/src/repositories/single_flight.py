@@ -0,0 +1,48 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+# keys whose coalesced call counts are kept for metrics
+MAX_TRACKED_KEYS = 1000
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical reads inside one worker
+    - first caller of a key runs the load, others await the same task
+    - load runs as its own task so a cancelled caller (client gone)
+      does not cancel it for the others
+    - nothing is cached, key is free again once the load finishes
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self._coalesced_by_key: "OrderedDict[str, int]" = OrderedDict()
+
+    async def do(self, key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+            self._coalesced_by_key[key] = self._coalesced_by_key.pop(key, 0) + 1
+            if len(self._coalesced_by_key) > MAX_TRACKED_KEYS:
+                self._coalesced_by_key.popitem(last=False)
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        # counters only, served on the unauthenticated metrics endpoint
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
+
+    def top_coalesced_keys(self, top: int = 10) -> Dict[str, int]:
+        """Most coalesced keys, carry entity ids so kept out of metrics"""
+        return dict(sorted(self._coalesced_by_key.items(), key=lambda item: item[1], reverse=True)[:top])
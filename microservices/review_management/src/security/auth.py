@@ -3,11 +3,10 @@ from fastapi import Request
 
 from src.security.exceptions import AppException
 from src.models.users import UserModel
+from src.security.permissions import CompiledPermissions
 
 
 async def authenticate_and_authorize(rq: Request):
-    # TODO add wildcard logic
-
     # action like create_article
     # required permission to access this endpoint
     required_permission =  rq.scope["route"].name
@@ -21,20 +20,48 @@ async def authenticate_and_authorize(rq: Request):
 
     token = rq.headers.get("authorization").split("Bearer ")[1]
 
-    decoded = jwt.decode(token, algorithms="RS256", options={"verify_signature": False})
-    if decoded.get("typ") != "ac":
+    # signature verification is the expensive part of every request
+    # clients reuse same token so verified claims are cached until exp
+    cached = rq.app.token_cache.get(token)
+    if cached:
+        verified_decoded, permissions = cached
+    else:
+        signing_key = await rq.app.key_set.get(jwt.get_unverified_header(token).get("kid"))
+        verified_decoded = jwt.decode(
+            token, key=signing_key.key, algorithms=[signing_key.algorithm_name],
+            options={"verify_signature": True, "verify_exp": True}
+        )
+        if verified_decoded.get("typ") != "ac":
+            raise AppException(
+                error_message="invalid token type",
+                error_code="exceptions.invalidTokenType",
+                status_code=401
+            )
+        if "prm" in verified_decoded:
+            permission_names = verified_decoded["prm"]
+        else:
+            # compact bitmap claim, names resolved with IAM's permission registry
+            permission_names = await rq.app.permission_registry.decode(
+                verified_decoded.get("pbm", ""), verified_decoded.get("prv", 0)
+            )
+        # wildcard grants like article:* or *_article compiled once per token
+        permissions = CompiledPermissions(permission_names)
+        rq.app.token_cache.set(token, verified_decoded, permissions)
+
+    # checked on every request since token may be revoked after caching
+    # only a local bloom lookup when token is not revoked
+    if rq.app.revoked_tokens.is_revoked(verified_decoded.get("jti", "")):
         raise AppException(
-            error_message="invalid token type",
-            error_code="exceptions.invalidTokenType",
+            error_message="token revoked",
+            error_code="exceptions.tokenRevoked",
             status_code=401
         )
 
-    verified_decoded = jwt.decode(token, key=rq.app.public_key, algorithms="RS256", options={"verify_signature": True, "verify_exp": True})
-    if required_permission not in verified_decoded["prm"]:
+    if not permissions.allows(required_permission):
         raise AppException(
             error_message="User has no permission take this action",
             error_code="exceptions.userNotAuthorized",
             status_code=403
         )
 
-    return UserModel(id=verified_decoded["sub"], permissions=verified_decoded["prm"])
+    return UserModel(id=verified_decoded["sub"], permissions=list(permissions.names))
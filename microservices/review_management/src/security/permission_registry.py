@@ -0,0 +1,110 @@
+import asyncio
+import base64
+import logging
+import time
+from typing import Dict, List, Tuple
+
+import aiohttp
+
+from src.security.exceptions import AppException
+
+logger = logging.getLogger(__name__)
+
+# decoded bitmaps kept in memory, tokens of same role share one bitmap
+MAX_DECODED_BITMAPS = 1024
+# seconds between refreshes triggered by tokens of an unknown version
+REFRESH_MIN_INTERVAL = 1
+# failed refreshes are retried after 1, 2, 4 ... seconds up to this
+REFRESH_MAX_BACKOFF = 60
+
+
+def decode_permission_bitmap(bitmap: str) -> List[int]:
+    raw = base64.urlsafe_b64decode(bitmap + "=" * (-len(bitmap) % 4))
+    value = int.from_bytes(raw, "little")
+    bit_indexes = []
+    bit_index = 0
+    while value:
+        if value & 1:
+            bit_indexes.append(bit_index)
+        value >>= 1
+        bit_index += 1
+    return bit_indexes
+
+
+class PermissionRegistry:
+    """
+    Locally cached copy of IAM's permission registry
+    - tokens carry permissions as bitmap (pbm) with registry version (prv)
+    - registry is append only so it is only fetched again when a token
+      was issued with a newer version than the cached one
+    - refreshes are rate limited, while IAM is unreachable requests
+      needing one fail fast with 503
+    """
+
+    def __init__(self, registry_url=None):
+        self.registry_url = registry_url
+        self._names: List[str] = []
+        self._decoded: Dict[str, Tuple[str, ...]] = {}
+        self._refresh_lock = asyncio.Lock()
+        self._next_refresh_at = 0.0
+        self._failures = 0
+
+    @property
+    def version(self) -> int:
+        return len(self._names)
+
+    async def refresh(self):
+        if not self.registry_url:
+            return
+        async with aiohttp.ClientSession() as session:
+            async with session.get(self.registry_url) as response:
+                response.raise_for_status()
+                registry = await response.json()
+        if registry["version"] > self.version:
+            self._names = registry["permissions"]
+
+    async def _refresh_for(self, version: int) -> None:
+        async with self._refresh_lock:
+            # refreshed by a concurrent request meanwhile
+            if version <= self.version:
+                return
+            if time.monotonic() < self._next_refresh_at:
+                if self._failures:
+                    raise AppException(
+                        error_message="permission registry unavailable",
+                        error_code="exceptions.permissionRegistryUnavailable",
+                        status_code=503
+                    )
+                return
+            try:
+                await self.refresh()
+            except Exception as exc:
+                self._failures += 1
+                backoff = min(REFRESH_MIN_INTERVAL * 2 ** (self._failures - 1), REFRESH_MAX_BACKOFF)
+                self._next_refresh_at = time.monotonic() + backoff
+                logger.warning("permission registry refresh failed: {}".format(exc))
+                raise AppException(
+                    error_message="permission registry unavailable",
+                    error_code="exceptions.permissionRegistryUnavailable",
+                    status_code=503
+                )
+            self._failures = 0
+            self._next_refresh_at = time.monotonic() + REFRESH_MIN_INTERVAL
+
+    async def decode(self, bitmap: str, version: int) -> Tuple[str, ...]:
+        if version > self.version:
+            await self._refresh_for(version)
+            if version > self.version:
+                raise AppException(
+                    error_message="unknown permission registry version",
+                    error_code="exceptions.unknownPermissionRegistryVersion",
+                    status_code=401
+                )
+
+        names = self._decoded.get(bitmap)
+        if names is None:
+            names = tuple(self._names[bit_index] for bit_index in decode_permission_bitmap(bitmap))
+            if len(self._decoded) >= MAX_DECODED_BITMAPS:
+                self._decoded.clear()
+            self._decoded[bitmap] = names
+        return names
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+
+import redis.asyncio
+
+logger = logging.getLogger(__name__)
+
+# written by IAM on every token revoke
+REVOKED_TOKENS_STREAM = "revoked_tokens"
+STREAM_READ_COUNT = 1000
+STREAM_BLOCK_MS = 5000
+# expired jtis are dropped and bloom rebuilt this often (seconds)
+PRUNE_INTERVAL = 600
+
+
+class BloomFilter:
+    def __init__(self, expected_items, false_positive_rate):
+        expected_items = max(expected_items, 1)
+        self.size = max(int(-expected_items * math.log(false_positive_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(self.size / expected_items * math.log(2)), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # double hashing, two 64 bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevokedTokenFilter:
+    """
+    Local view of revoked jtis, kept in sync with IAM through redis stream
+    - bloom filter answers the common "not revoked" case with bit lookups
+    - exact jti -> exp map confirms bloom hits so false positives
+      never reject a valid token
+    - entries are kept until token exp, expired ones pruned periodically
+    """
+
+    def __init__(self, url, expected_items=100000, false_positive_rate=0.001):
+        # separate connection since stream reads block
+        self._redis = redis.asyncio.from_url(url, decode_responses=True)
+        self.expected_items = expected_items
+        self.false_positive_rate = false_positive_rate
+        self._bloom = BloomFilter(expected_items, false_positive_rate)
+        self._revoked = {}
+        self._last_id = "0-0"
+        self._last_prune = time.monotonic()
+
+    def _add(self, jti, exp):
+        self._revoked[jti] = exp
+        self._bloom.add(jti)
+
+    def _prune(self):
+        now = time.time()
+        self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+        bloom = BloomFilter(max(self.expected_items, len(self._revoked)), self.false_positive_rate)
+        for jti in self._revoked:
+            bloom.add(jti)
+        self._bloom = bloom
+        self._last_prune = time.monotonic()
+
+    def _apply(self, entries):
+        for entry_id, fields in entries:
+            self._add(fields["jti"], int(fields["exp"]))
+            self._last_id = entry_id
+
+    async def sync(self):
+        """Read every stream entry after last seen one"""
+        while True:
+            entries = await self._redis.xrange(
+                REVOKED_TOKENS_STREAM, min=f"({self._last_id}", count=STREAM_READ_COUNT
+            )
+            self._apply(entries)
+            if len(entries) < STREAM_READ_COUNT:
+                break
+
+    async def run_sync_loop(self):
+        while True:
+            try:
+                streams = await self._redis.xread(
+                    {REVOKED_TOKENS_STREAM: self._last_id}, count=STREAM_READ_COUNT, block=STREAM_BLOCK_MS
+                )
+                for _, entries in streams or []:
+                    self._apply(entries)
+                if time.monotonic() - self._last_prune > PRUNE_INTERVAL:
+                    self._prune()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("revoked token stream read failed: {}".format(exc))
+                await asyncio.sleep(1)
+
+    def is_revoked(self, jti):
+        if jti not in self._bloom:
+            return False
+        exp = self._revoked.get(jti)
+        return exp is not None and exp > time.time()
+
+    def stats(self):
+        return {"revoked": len(self._revoked), "bloom_bits": self._bloom.size}
+
+    async def close(self):
+        await self._redis.close()
@@ -3,6 +3,7 @@ from datetime import datetime
 
 from src.models.reviews import ReviewModel, ReviewCreateModel, ReviewUpdateModel
 from src.models.users import UserModel
+from src.repositories.keyset import decode_cursor
 from src.security.exceptions import AppException
 
 
@@ -36,6 +37,16 @@ class ReviewService:
         review._id = review_id
         return review
 
+    async def get_review_body(self, review_id: str) -> bytes:
+        body = await self.repo.get_body(review_id)
+        if body is None:
+            raise AppException(
+                error_message="review not found",
+                error_code="exceptions.reviewNotFound",
+                status_code=404
+            )
+        return body
+
     async def update_review(self, update_payload: ReviewUpdateModel, review_id: str, current_user:UserModel):
         update_payload = update_payload.model_dump(exclude_unset=True)
         update_payload["updated_by"] = current_user.id.hex
@@ -60,8 +71,24 @@ class ReviewService:
         return {}
 
     async def query_reviews(self, query_parameters):
+        after = None
+        if query_parameters.cursor:
+            if query_parameters.skip:
+                raise AppException(
+                    error_message="skip can not be combined with cursor",
+                    error_code="exceptions.invalidCursor",
+                    status_code=400
+                )
+            try:
+                after = decode_cursor(query_parameters.cursor, query_parameters.sort_by, query_parameters.sort_dir)
+            except ValueError:
+                raise AppException(
+                    error_message="invalid cursor",
+                    error_code="exceptions.invalidCursor",
+                    status_code=400
+                )
         result = await self.repo.query(
             query_parameters.skip, query_parameters.limit, query_parameters.filter,
-            query_parameters.sort_by, query_parameters.sort_dir, query_parameters.select
+            query_parameters.sort_by, query_parameters.sort_dir, query_parameters.select, after
         )
         return result
\ No newline at end of file
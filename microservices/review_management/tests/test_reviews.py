@@ -6,6 +6,7 @@ from cryptography.hazmat.primitives import serialization
 
 from fastapi.testclient import TestClient
 from aioresponses import aioresponses
+from bson import ObjectId
 
 from src import create_fastapi_app
 from configs.test import test_config
@@ -367,3 +368,123 @@ async def test_success_review_update_cache(client):
         assert db_get_body_after_update == cache_get_body_after_update
         assert db_get_body_after_update["star_ratio"] == 2
         assert cache_get_body_after_update["star_ratio"] == 2
+
+@pytest.mark.asyncio
+async def test_success_review_query_cache_invalidated_per_article(client):
+    with client as client:
+        article_id = str(ObjectId())
+        other_article_id = str(ObjectId())
+        token, token_payload = create_test_jwt(
+            client.app.config["test_encryption_file_path"],
+            ["create_review", "query_reviews"]
+        )
+        headers = {
+            "Authorization": "Bearer " + token
+        }
+        reviews_query_payload = {"filter": {"article_id": article_id}, "select": ["_id"]}
+
+        with aioresponses() as mocker:
+            for _id in (article_id, other_article_id):
+                mock_url = f'{client.app.config["article_service_base_url"]}/api/v1/articles/{_id}'
+                mocker.get(mock_url, payload={"_id": _id}, status=200, repeat=True)
+
+            review_create_payload = {"article_id": article_id, "review_content": "first", "star_ratio": 4}
+            response = client.post("api/v1/reviews", json=review_create_payload, headers=headers)
+            assert response.status_code == 201
+
+            response = client.post("api/v1/reviews/query", json=reviews_query_payload, headers=headers)
+            assert response.json()["count"] == 1
+
+            # written behind the cache's back, only visible once article's queries are invalidated
+            client.portal.call(client.app.db["reviews"].insert_one, {
+                "article_id": article_id, "review_content": "direct", "star_ratio": 3
+            })
+
+            # review of another article keeps this article's cached queries
+            review_create_payload = {"article_id": other_article_id, "review_content": "other", "star_ratio": 5}
+            response = client.post("api/v1/reviews", json=review_create_payload, headers=headers)
+            assert response.status_code == 201
+
+            response = client.post("api/v1/reviews/query", json=reviews_query_payload, headers=headers)
+            assert response.json()["count"] == 1
+
+            # review of same article invalidates them
+            review_create_payload = {"article_id": article_id, "review_content": "second", "star_ratio": 2}
+            response = client.post("api/v1/reviews", json=review_create_payload, headers=headers)
+            assert response.status_code == 201
+
+            response = client.post("api/v1/reviews/query", json=reviews_query_payload, headers=headers)
+            assert response.json()["count"] == 3
+
+        # query read before a write, stored after its invalidation, is not cached
+        cache = client.app.cache_repository
+        tag = f"review:query:article:{article_id}"
+        versions = client.portal.call(cache.get_tag_versions, tag)
+        client.portal.call(cache.invalidate_tags, tag)
+        stored = client.portal.call(lambda: cache.set_tagged("review:query:stale", {"count": 0}, [tag], versions=versions))
+        assert not stored
+        assert client.portal.call(cache.get, "review:query:stale") is None
+        versions = client.portal.call(cache.get_tag_versions, tag)
+        assert client.portal.call(lambda: cache.set_tagged("review:query:stale", {"count": 0}, [tag], versions=versions))
+
+@pytest.mark.asyncio
+async def test_success_review_query_cursor_pagination(client):
+    with client as client:
+        article_id = str(ObjectId())
+        token, token_payload = create_test_jwt(
+            client.app.config["test_encryption_file_path"],
+            ["create_review", "query_reviews"]
+        )
+        headers = {
+            "Authorization": "Bearer " + token
+        }
+
+        with aioresponses() as mocker:
+            mock_url = f'{client.app.config["article_service_base_url"]}/api/v1/articles/{article_id}'
+            mocker.get(mock_url, payload={"_id": article_id}, status=200, repeat=True)
+            for star_ratio in (5, 3, 4):
+                review_create_payload = {"article_id": article_id, "review_content": "paged", "star_ratio": star_ratio}
+                response = client.post("api/v1/reviews", json=review_create_payload, headers=headers)
+                assert response.status_code == 201
+
+        reviews_query_payload = {
+            "filter": {"article_id": article_id}, "limit": 2, "sort_by": "review_content", "select": ["_id"]
+        }
+        ids = []
+        while True:
+            response = client.post("api/v1/reviews/query", json=reviews_query_payload, headers=headers)
+            assert response.status_code == 200
+            page = response.json()
+            ids.extend(doc["_id"] for doc in page["docs"])
+            if not page["next_cursor"]:
+                break
+            reviews_query_payload["cursor"] = page["next_cursor"]
+
+        assert len(ids) == 3
+        assert ids == sorted(ids)
+
+@pytest.mark.asyncio
+async def test_success_review_write_through_cache(client):
+    with client as client:
+        article_id = str(ObjectId())
+        token, token_payload = create_test_jwt(
+            client.app.config["test_encryption_file_path"],
+            ["create_review", "get_review"]
+        )
+        headers = {
+            "Authorization": "Bearer " + token
+        }
+        with aioresponses() as mocker:
+            mock_url = f'{client.app.config["article_service_base_url"]}/api/v1/articles/{article_id}'
+            mocker.get(mock_url, payload={"_id": article_id}, status=200, repeat=True)
+
+            review_create_payload = {"article_id": article_id, "review_content": "cached on create", "star_ratio": 5}
+            response = client.post("api/v1/reviews", json=review_create_payload, headers=headers)
+            assert response.status_code == 201
+            review_id = response.json()["_id"]
+
+        # removed behind the cache's back, get is served from entity cache written by create
+        client.portal.call(client.app.db["reviews"].delete_one, {"_id": ObjectId(review_id)})
+        response = client.get(f"api/v1/reviews/{review_id}", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["review_content"] == "cached on create"